@@ -1,29 +1,212 @@
 """
 NWT Climate Explorer
 """
-# pylint: disable=invalid-name, import-error, line-too-long, too-many-arguments
+# pylint: disable=invalid-name, import-error, line-too-long, too-many-arguments, wrong-import-position
 import os
+import sys
+import time
+
+startup_start = time.perf_counter()
+
 import json
-import itertools
-import plotly.graph_objs as go
+import base64
+import functools
+import numpy as np
 import dash
-from dash.dependencies import Input, Output
-import pandas as pd
+from dash import html
+from dash.exceptions import PreventUpdate
+from flask import Response, request
+from dash.dependencies import ClientsideFunction, Input, Output, State
 import luts
 from gui import layout
+from store import ClimateStore, memory_usage
+from cache import FigureCache, FileBackend
+from pool import CallbackPool
+import metrics
+import responses
+
+
+# Map the data cube (or read it into memory with DATA_MMAP=0) and
+# report what that cost this worker
+memory_before = memory_usage()
+load_start = time.perf_counter()
+data = ClimateStore.load("data", mmap=os.getenv("DATA_MMAP", "1") != "0")
+load_time = time.perf_counter() - load_start
+memory_after = memory_usage()
+if memory_before and memory_after:
+    print(
+        f"Worker {os.getpid()} loaded data in {load_time * 1000:.1f} ms, "
+        f"RSS {memory_before['rss'] / 2 ** 20:.1f} -> {memory_after['rss'] / 2 ** 20:.1f} MiB "
+        f"(shared {memory_after['shared'] / 2 ** 20:.1f} MiB)",
+        file=sys.stderr,
+    )
 
-
-# Read pickled data blobs and other items used from env
-data = pd.read_pickle("data.pickle")
-communities = pd.read_pickle("community_places.pickle")
 mapbox_access_token = os.environ["MAPBOX_ACCESS_TOKEN"]
 
+# Draw the graph entirely in the browser from per-community data bundles
+# (CLIENTSIDE_RENDERING=1) instead of computing traces on the server
+clientside_rendering = os.getenv("CLIENTSIDE_RENDERING") == "1"
+
+# Traces for recently requested graph selections,
+# optionally shared with the other worker processes on this host
+cache_ttl = float(os.getenv("FIGURE_CACHE_TTL", "3600"))
+if os.getenv("SHARED_CACHE_DIR"):
+    shared_cache = FileBackend(
+        os.getenv("SHARED_CACHE_DIR"),
+        ttl=cache_ttl,
+        max_entries=int(os.getenv("SHARED_CACHE_SIZE", "4096")),
+    )
+else:
+    shared_cache = None
+
+figure_cache = FigureCache(
+    max_entries=int(os.getenv("FIGURE_CACHE_SIZE", "256")),
+    max_bytes=int(os.getenv("FIGURE_CACHE_BYTES", "0")),
+    ttl=cache_ttl,
+    shared=shared_cache,
+    namespace="traces",
+)
+comparison_cache = FigureCache(
+    max_entries=int(os.getenv("FIGURE_CACHE_SIZE", "256")),
+    max_bytes=int(os.getenv("FIGURE_CACHE_BYTES", "0")),
+    ttl=cache_ttl,
+    shared=shared_cache,
+    namespace="comparison",
+)
+
+# Identical graph computations in flight are shared; CALLBACK_THREADS=N
+# runs them on a pool of N threads, dropping those superseded while queued
+callback_pool = CallbackPool(int(os.getenv("CALLBACK_THREADS", "0")))
+
 app = dash.Dash(__name__)
 
 # AWS Elastic Beanstalk looks for application by default,
 # if this variable (application) isn't set you will get a WSGI error.
 application = app.server
 
+# Opt-in callback timings (METRICS_ENABLED=1), served at /metrics
+metrics.register_stats("graph_cache", figure_cache.stats)
+metrics.register_stats("comparison_cache", comparison_cache.stats)
+metrics.register_stats("callback_pool", callback_pool.stats)
+metrics.init_app(app, app.config.routes_pathname_prefix + "metrics")
+
+# Compression, asset cache headers and ETags (HTTP_COMPRESSION=0 to disable)
+responses.init_app(application, app.config.routes_pathname_prefix)
+callback_pool.init_app(app)
+
+
+@functools.lru_cache(maxsize=None)
+def community_bundle_json(community):
+    """ JSON of the data bundle for the community at position `community`. """
+    return json.dumps(data.community_bundle(luts.community_names[community]))
+
+
+@application.route(app.config.routes_pathname_prefix + "bundles/<int:community>.json")
+def community_bundle(community):
+    """ Serve a community's data bundle for clientside rendering. """
+    if community >= len(luts.community_names):
+        return Response("Unknown community", status=404)
+    response = Response(community_bundle_json(community), mimetype="application/json")
+    response.headers["Cache-Control"] = "public, max-age=86400"
+    response.add_etag()
+    return response
+
+
+export_columns = ["community", "model", "scenario", "year", "month", "variable", "value"]
+
+
+def parse_export_args(args):
+    """
+    The communities, year range, scenarios, models, months and variables to
+    export, from query parameters named after the graph controls: `community`
+    (positions, or "all"), `start`/`end`, `scenario`, `model`, `month`,
+    `annual` and `variable`, all but the years repeatable.  Missing
+    parameters select everything; empty ones (e.g. `model=`) nothing.
+    """
+
+    def values(name, default):
+        if name not in args:
+            return list(default)
+        return [value for value in args.getlist(name) if value]
+
+    if args.get("community", "all") == "all":
+        communities = luts.community_names
+    else:
+        positions = dict.fromkeys(int(c) for c in values("community", []))
+        if not all(0 <= c < len(luts.community_names) for c in positions):
+            raise ValueError("Unknown community")
+        communities = [luts.community_names[c] for c in positions]
+    years = data.labels["year"]
+    year_range = [int(args.get("start", years[0])), int(args.get("end", years[-1]))]
+    months = [int(m) for m in values("month", range(1, 13))]
+    if "annual" in args:
+        months = list(range(1, 13))
+    variables = values("variable", luts.variables_lut)
+    if not set(variables) <= set(luts.variables_lut):
+        raise ValueError("Unknown variable")
+    return (
+        communities,
+        year_range,
+        values("scenario", luts.scenarios_lut),
+        values("model", luts.models_lut),
+        months,
+        variables,
+    )
+
+
+def export_series(fmt, communities, year_range, scenarios, models, months, variables):
+    """
+    Yield the selected series as CSV rows or a JSON array of series, one
+    community and variable at a time, so only that much is ever in memory.
+    """
+    if fmt == "csv":
+        yield ",".join(export_columns) + "\n"
+    else:
+        yield "["
+    separator = ""
+    for community in communities:
+        for variable in variables:
+            selected = data.series(community, models, scenarios, year_range, months, variable)
+            selected = selected.rename(columns={variable: "value"})
+            selected["community"] = community
+            selected["variable"] = variable
+            if fmt == "csv":
+                yield selected[export_columns].to_csv(header=False, index=False)
+                continue
+            for (model, scenario, month), rows in selected.groupby(["model", "scenario", "month"]):
+                series = {
+                    "community": community,
+                    "model": model,
+                    "scenario": scenario,
+                    "month": month,
+                    "variable": variable,
+                    "year": rows["year"].tolist(),
+                    "value": rows["value"].tolist(),
+                }
+                # default=int for the numpy integer months
+                yield separator + json.dumps(series, default=int)
+                separator = ","
+    if fmt == "json":
+        yield "]"
+
+
+@application.route(app.config.routes_pathname_prefix + "export.<any(csv, json):fmt>")
+def export(fmt):
+    """
+    Stream the series for a selection (see `parse_export_args`) as CSV or
+    JSON, e.g. export.csv?community=45&month=7&variable=tas
+    """
+    try:
+        selection = parse_export_args(request.args)
+    except ValueError:
+        return Response("Invalid selection", status=400)
+    return Response(
+        export_series(fmt, *selection),
+        mimetype="text/csv" if fmt == "csv" else "application/json",
+        headers={"Content-Disposition": f"attachment; filename=nwt-climate.{fmt}"},
+    )
+
+
 # Customize this layout to include Google Analytics
 app.index_string = f"""
 <!DOCTYPE html>
@@ -38,6 +221,7 @@ app.index_string = f"""
         </script>
         {{%metas%}}
         <title>{{%title%}}</title>
+        <script>window.nwtLuts = {json.dumps(luts.client_luts)};</script>
         {{%favicon%}}
         {{%css%}}
     </head>
@@ -56,114 +240,160 @@ app.title = "NWT Climate Scenarios Explorer"
 app.layout = layout
 
 
-def build_plot_title(location, variable, start, end, annual, months, scenarios, models):
-    """ Return a string containing the map title """
-
-    def join_strings_with_commas(lut, items):
-        return ", ".join(list(map(lambda k: lut[k], items))).rstrip(", ")
-
-    title = location + "<br>"
-    if annual:
-        title += "Decadal Annual Mean "
-        months_fragment = ""
-    else:
-        title += "Decadal Monthly Mean "
-        months.sort()
-        months_fragment = "<br>" + join_strings_with_commas(luts.months_lut, months)
-        if len(months) > 1:
-            months_fragment += " Averaged"
-
-    title += (
-        luts.variables_lut[variable] + ", " + str(start) + "-" + str(end) + months_fragment
-    )
-
-    return title
+def typed_array(values, dtype):
+    """
+    Plotly's base64 typed-array encoding of `values`, e.g. with dtype "i2"
+    for years: about half the bytes of a JSON list, decoded straight into a
+    typed array by plotly.js.
+    """
+    values = np.asarray(values, dtype="<" + dtype)
+    return {"dtype": dtype, "bdata": base64.b64encode(values.tobytes()).decode("ascii")}
 
 
-def average_months(dff, model, scenario, variable_value):
+def ensemble_traces(envelope):
     """
-    in case of multiple months allowed to be chosen
-    average all of the months together to single traces.
+    Three traces per scenario from `ClimateStore.ensemble` rows: the
+    maximum, the minimum filled up to it, and the median.
     """
-    sub_df = dff[(dff["model"] == model) & (dff["scenario"] == scenario)]
-    dfm = (
-        sub_df.groupby("month")
-        .apply(lambda x: x[variable_value].reset_index(drop=True))
-        .T.mean(axis=1)
-        .copy()
+    traces = []
+    for scenario, rows in envelope.groupby("scenario"):
+        name = luts.scenarios_lut[scenario]
+        colors = luts.scenario_colors[scenario]
+        years = typed_array(rows["year"], "i2")
+        traces += [
+            {
+                "type": "scatter",
+                "x": years,
+                "y": rows["max"].tolist(),
+                "name": name + " model maximum",
+                "legendgroup": scenario,
+                "showlegend": False,
+                "line": {"color": colors["line"], "width": 0},
+                "mode": "lines",
+            },
+            {
+                "type": "scatter",
+                "x": years,
+                "y": rows["min"].tolist(),
+                "name": name + " model range",
+                "legendgroup": scenario,
+                "fill": "tonexty",
+                "fillcolor": colors["fill"],
+                "line": {"color": colors["line"], "width": 0},
+                "mode": "lines",
+            },
+            {
+                "type": "scatter",
+                "x": years,
+                "y": rows["median"].tolist(),
+                "name": name + " model median",
+                "legendgroup": scenario,
+                "line": {"color": colors["line"], "width": 2},
+                "mode": "lines",
+            },
+        ]
+    return traces
+
+
+def graph_cache_key(
+    community,
+    year_range,
+    scenario_values,
+    model_values,
+    months,
+    all_check,
+    variable_value,
+    model_display="lines",
+):
+    """
+    Normalize the graph inputs so equivalent selections share a cache entry:
+    order doesn't matter for lists, and "All months" ignores the dropdown.
+    """
+    annual = "all" in all_check
+    if annual:
+        months = range(1, 13)
+    return (
+        community,
+        tuple(year_range),
+        tuple(sorted(set(scenario_values))),
+        tuple(sorted(set(model_values))),
+        tuple(sorted(set(months))),
+        annual,
+        variable_value,
+        model_display,
     )
 
-    # convert back to a DataFrame from the output Series...
-    dfm = dfm.to_frame(name=variable_value).reset_index(drop=True)
-
-    # Round to one digit
-    dfm[variable_value] = dfm[variable_value].apply(lambda x: round(x, 1))
 
-    dfm["year"] = sub_df["year"].unique()
-    dfm["model"] = model
-    dfm["scenario"] = scenario
-    dfm["month"] = "_".join(["avg"] + [str(m) for m in dff.month.unique()])
-
-    return dfm
-
-
-@app.callback(
-    Output("month-dropdown", "disabled"), [Input("all-month-check", "value")]
+# Disable months selector when "All months" is selected
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="disableMonthDropdown"),
+    Output("month-dropdown", "disabled"),
+    [Input("all-month-check", "value")],
 )
-def disable_month_dropdown(values):
-    """ Disable months selector when "All months" is selected """
-    return bool(values)
 
 
 @app.callback(
     Output("communities-dropdown", "value"), [Input("minesites-map", "clickData")]
 )
+@metrics.timed_callback("update_mine_site_dropdown")
 def update_mine_site_dropdown(selected_on_map):
     """ If user clicks on the map, update the drop down. """
 
-    # if "territory-wide" is checked, ignore map clicks
+    # Map points carry their community's position as customdata
     if selected_on_map is not None:
-        community_name = selected_on_map["points"][0]["text"]
-        community_loc = luts.communities[luts.communities['name'] == community_name].index[0]
-        return community_loc
+        return selected_on_map["points"][0]["customdata"]
     # Return a default
-    return 45
+    return luts.default_community
+
+
+graph_inputs = [
+    Input("communities-dropdown", "value"),
+    Input("range-slider", "value"),
+    Input("scenario-check", "value"),
+    Input("model-dropdown", "value"),
+    Input("month-dropdown", "value"),
+    Input("all-month-check", "value"),
+    Input("variable-toggle", "value"),
+    Input("model-display", "value"),
+]
+
+
+# Keep the download links pointing at the data behind the graph
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="exportLinks"),
+    [Output("export-csv", "href"), Output("export-json", "href")],
+    graph_inputs,
+)
 
 
-@app.callback(
-    Output("minesites-map", "figure"), [Input("communities-dropdown", "value")]
+# Highlighting the selected community only restyles the map in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="highlightCommunity"),
+    Output("minesites-map", "figure"),
+    [Input("communities-dropdown", "value")],
+    [State("minesites-map", "figure")],
 )
-def update_selected_community_on_map(community):
-    """ Draw a second trace on the map with one community highlighted. """
-    return {
-        "data": [
-            luts.places_trace,
-            go.Scattermapbox(
-                lat=[luts.communities.loc[community]["latitude"]],
-                lon=[luts.communities.loc[community]["longitude"]],
-                mode="markers",
-                marker={"size": 20, "color": "rgb(207, 38, 47)"},
-                line={"color": "rgb(0, 0, 0)", "width": 2},
-                text=luts.communities.loc[community]["name"],
-                hoverinfo="text",
-            ),
-        ],
-        "layout": luts.map_layout,
-    }
 
 
-@app.callback(
+# The server sends only the traces; the title and layout
+# are composed in the browser from the selection
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="renderGraph"),
     Output("my-graph", "figure"),
+    [Input("graph-traces", "data")],
     [
-        Input("communities-dropdown", "value"),
-        Input("range-slider", "value"),
-        Input("scenario-check", "value"),
-        Input("model-dropdown", "value"),
-        Input("month-dropdown", "value"),
-        Input("all-month-check", "value"),
-        Input("variable-toggle", "value"),
+        State("communities-dropdown", "value"),
+        State("range-slider", "value"),
+        State("month-dropdown", "value"),
+        State("all-month-check", "value"),
+        State("variable-toggle", "value"),
     ],
 )
+
+
+@metrics.timed_callback("update_graph")
+@figure_cache.memoize(graph_cache_key)
+@callback_pool.coalesce("update_graph", graph_cache_key)
 def update_graph(
     community,
     year_range,
@@ -172,97 +402,306 @@ def update_graph(
     months,
     all_check,
     variable_value,
+    model_display="lines",
 ):
-    """ Update graph from UI controls """
+    """ Update the graph's traces from UI controls """
+
+    # Subset community, scenarios, models, years and months
+    community = luts.community_names[community]
+
+    if "all" in all_check:
+        months = list(range(1, 13))
 
-    # Subset community, scenarios, and models
-    community_ix = community
-    community = communities.iloc[community].name
+    if model_display == "ensemble":
+        with metrics.timed("update_graph", "query"):
+            envelope = data.ensemble(
+                community, model_values, scenario_values, year_range, months, variable_value
+            )
+        with metrics.timed("update_graph", "traces"):
+            return ensemble_traces(envelope)
 
-    selected = data[data.community.isin([community])]
-    selected = selected[selected.scenario.isin(scenario_values)]
-    selected = selected[selected.model.isin(model_values)]
+    # Average the selected months together for each model/scenario
+    with metrics.timed("update_graph", "query"):
+        selected = data.series(
+            community, model_values, scenario_values, year_range, months, variable_value
+        )
+
+    # Plain dicts skip plotly's validation of every trace property.  Values
+    # are already at display precision (tenths), which short JSON numbers
+    # hold exactly in fewer bytes than float arrays would.
+    with metrics.timed("update_graph", "traces"):
+        traces = [
+            {
+                "type": "scatter",
+                "x": typed_array(j["year"], "i2"),
+                "y": j[variable_value].tolist(),
+                "name": luts.models_lut[i[0]] + " " + luts.scenarios_lut[i[1]],
+                "line": {"color": luts.ms_colors[i[0]][i[1]], "width": 2},
+                "mode": "lines",
+            }
+            for i, j in selected.groupby(["model", "scenario", "month"])
+        ]
+
+    return traces
 
-    # Subset by year range
-    begin_range, end_range = year_range
-    selected = selected[
-        (selected["year"] >= begin_range) & (selected["year"] <= end_range)
-    ]
 
-    # Filter by months
+if clientside_rendering:
+    # Fetch a community's data once, then filter, average and build the
+    # traces in the browser (see assets/app.js)
+    app.clientside_callback(
+        ClientsideFunction(namespace="nwt", function_name="loadBundle"),
+        Output("community-bundle", "data"),
+        [Input("communities-dropdown", "value")],
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace="nwt", function_name="buildTraces"),
+        Output("graph-traces", "data"),
+        [Input("community-bundle", "data")] + graph_inputs[1:],
+    )
+else:
+    app.callback(Output("graph-traces", "data"), graph_inputs)(update_graph)
+
+
+@app.callback(
+    Output("stats-table", "children"),
+    [
+        Input("communities-dropdown", "value"),
+        Input("scenario-check", "value"),
+        Input("model-dropdown", "value"),
+        Input("month-dropdown", "value"),
+        Input("all-month-check", "value"),
+        Input("variable-toggle", "value"),
+    ],
+)
+@metrics.timed_callback("update_stats_table")
+def update_stats_table(community, scenario_values, model_values, months, all_check, variable_value):
+    """ Summary table of the precomputed statistics of the graphed series """
+    if data.stats is None:
+        return None
     if "all" in all_check:
         months = list(range(1, 13))
+    stats = data.series_stats(
+        luts.community_names[community],
+        model_values or [],
+        scenario_values or [],
+        months or [],
+        variable_value,
+    )
+    if stats is None:
+        return html.P(
+            "Trend statistics are available for single months and for annual and seasonal (DJF, MAM, JJA, SON) averages."
+        )
 
-    selected = selected.loc[
-        selected["month"].isin(months),
-    ]
-
-    # Perform averages grouped by model/scenario over selected months
-    if len(selected.month.unique()) > 1:
-        selected = pd.concat(
+    unit = luts.units[variable_value]
+    windows = {name: f"{begin}–{end + 9}" for name, (begin, end) in data.stat_windows.items()}
+    header = html.Tr(
+        [
+            html.Th("Series"),
+            html.Th(f"Trend ({unit}/century)"),
+            html.Th(f"Change ({unit})"),
+            html.Th(f"Model spread ({unit})"),
+        ]
+    )
+    rows = [
+        html.Tr(
             [
-                average_months(selected, model, scenario, variable_value)
-                for model, scenario in itertools.product(
-                    selected.model.unique(), selected.scenario.unique()
-                )
-            ],
-            axis=0,
+                html.Td(luts.models_lut[row.model] + " " + luts.scenarios_lut[row.scenario]),
+                html.Td(f"{row.trend:+.1f}"),
+                html.Td(f"{row.change:+.1f}"),
+                html.Td(f"{row.spread:.1f}"),
+            ]
         )
+        for row in stats.itertuples()
+    ]
+    return [
+        html.Table(className="table is-narrow", children=[html.Thead(header), html.Tbody(rows)]),
+        html.P(
+            className="is-size-7",
+            children=f"Trend: least-squares slope over {windows['trend']}. "
+            f"Change: {windows['late']} mean minus the {windows['baseline']} historical mean. "
+            "Model spread: range of that change across the five individual models.",
+        ),
+    ]
 
-    selected = selected.reset_index(drop=True)
 
-    title = build_plot_title(
-        luts.communities.loc[community_ix][0],
+def comparison_cache_key(
+    communities, model, scenario, year_range, months, all_check, variable_value
+):
+    """ Like graph_cache_key, for the comparison inputs. """
+    annual = "all" in all_check
+    if annual:
+        months = range(1, 13)
+    return (
+        tuple(sorted(set(communities or []), key=str)),
+        model,
+        scenario,
+        tuple(year_range),
+        tuple(sorted(set(months))),
+        annual,
         variable_value,
-        begin_range,
-        end_range,
-        all_check,
-        months,
-        scenario_values,
-        model_values,
     )
 
-    yaxis_title = {"tas": "Degrees Celsius", "pr": "Millimeters"}
 
-    return {
-        "data": [
-            go.Scatter(
-                x=j["year"],
-                y=j[variable_value],
-                name=luts.models_lut[i[0]] + " " + luts.scenarios_lut[i[1]],
-                line=dict(color=luts.ms_colors[i[0]][i[1]], width=2),
-                mode="lines",
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="showComparison"),
+    Output("compare-body", "style"),
+    [Input("compare-toggle", "value")],
+)
+
+# Passes the comparison inputs on only while the section is open
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="comparisonSelection"),
+    Output("comparison-selection", "data"),
+    [
+        Input("compare-toggle", "value"),
+        Input("compare-communities", "value"),
+        Input("compare-model", "value"),
+        Input("compare-scenario", "value"),
+        Input("range-slider", "value"),
+        Input("month-dropdown", "value"),
+        Input("all-month-check", "value"),
+        Input("variable-toggle", "value"),
+    ],
+)
+
+
+@metrics.timed_callback("update_comparison")
+@comparison_cache.memoize(comparison_cache_key)
+@callback_pool.coalesce("update_comparison", comparison_cache_key)
+def update_comparison(
+    communities, model, scenario, year_range, months, all_check, variable_value
+):
+    """
+    Traces comparing one model/scenario across the selected communities,
+    and optionally the mean over all of them ("mean").
+    """
+    communities = communities or []
+    if "all" in all_check:
+        months = list(range(1, 13))
+
+    with metrics.timed("update_comparison", "query"):
+        compared = data.compare(
+            [luts.community_names[c] for c in communities if c != "mean"],
+            model,
+            scenario,
+            year_range,
+            months,
+            variable_value,
+        )
+
+    traces = [
+        {
+            "type": "scatter",
+            "x": typed_array(rows["year"], "i2"),
+            "y": rows[variable_value].tolist(),
+            "name": community,
+            "mode": "lines",
+        }
+        for community, rows in compared.groupby("community")
+    ]
+
+    if "mean" in communities:
+        with metrics.timed("update_comparison", "territory_mean"):
+            territory = data.territory_mean(
+                model, scenario, year_range, months, variable_value
             )
-            for i, j in selected.groupby(["model", "scenario", "month"])
-        ],
-        "layout": {
-            "title": title,
-            "autosize": False,
-            "showlegend": True,
-            "height": 650,
-            "margin": dict(t=100, b=130),
-            "xaxis": dict(title="Year"),
-            "yaxis": dict(title=yaxis_title[variable_value]),
-            "annotations": [
-                {
-                    "x": 0.5,
-                    "y": -0.20,
-                    "xref": "paper",
-                    "yref": "paper",
-                    "showarrow": False,
-                    "text": "These plots are useful for examining possible trends over time, rather than for precisely predicting values.",
-                },
-                {
-                    "x": 0.5,
-                    "y": -0.24,
-                    "xref": "paper",
-                    "yref": "paper",
-                    "showarrow": False,
-                    "text": "Credit: Scenarios Network for Alaska + Arctic Planning, University of Alaska Fairbanks.",
-                },
-            ],
-        },
-    }
+        traces.append(
+            {
+                "type": "scatter",
+                "x": typed_array(territory["year"], "i2"),
+                "y": territory[variable_value].tolist(),
+                "name": luts.territory_mean_label,
+                "line": {"color": "#000", "width": 3, "dash": "dash"},
+                "mode": "lines",
+            }
+        )
+
+    return traces
+
+
+@app.callback(
+    Output("comparison-traces", "data"),
+    [Input("comparison-selection", "data")],
+    prevent_initial_call=True,
+)
+def comparison_traces(selection):
+    """ update_comparison for the selection of the opened comparison. """
+    if not selection:
+        raise PreventUpdate
+    return update_comparison(*selection)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace="nwt", function_name="renderComparison"),
+    Output("compare-graph", "figure"),
+    [Input("comparison-traces", "data")],
+    [State("comparison-selection", "data")],
+)
+
+
+def warm_up():
+    """
+    Compute the default view of every community (the selected one first)
+    into the graph cache -- or load their data bundles, when drawing in the
+    browser -- and request the page and the Dash routes a page load uses
+    once, so the first visitors to a new worker don't pay for cold code
+    paths and imports.
+    """
+    selection = luts.default_selection
+    communities = [luts.default_community] + [
+        c for c in range(len(luts.community_names)) if c != luts.default_community
+    ]
+    for community in communities:
+        if clientside_rendering:
+            community_bundle_json(community)
+        else:
+            update_graph(
+                community,
+                list(selection["year_range"]),
+                list(selection["scenarios"]),
+                list(selection["models"]),
+                list(selection["months"]),
+                [],
+                selection["variable"],
+                "lines",
+            )
+    update_stats_table(
+        luts.default_community,
+        selection["scenarios"],
+        selection["models"],
+        selection["months"],
+        [],
+        selection["variable"],
+    )
+    update_comparison(
+        [luts.default_community, "mean"],
+        selection["compare_model"],
+        selection["compare_scenario"],
+        list(selection["year_range"]),
+        list(selection["months"]),
+        [],
+        selection["variable"],
+    )
+
+    client = application.test_client()
+    for route in ["", "_dash-layout", "_dash-dependencies"]:
+        client.get(
+            app.config.routes_pathname_prefix + route,
+            headers={"Accept-Encoding": "gzip, br"},
+        )
+
+
+# Warm up before taking traffic; WARM_UP=0 skips it for a faster boot
+warm_up_time = None
+if os.getenv("WARM_UP", "1") != "0":
+    warm_up_start = time.perf_counter()
+    warm_up()
+    warm_up_time = time.perf_counter() - warm_up_start
+print(
+    f"Worker {os.getpid()} started in {(time.perf_counter() - startup_start) * 1000:.0f} ms"
+    + (f" (warm-up {warm_up_time * 1000:.0f} ms)" if warm_up_time is not None else " (no warm-up)"),
+    file=sys.stderr,
+)
 
 
 if __name__ == "__main__":
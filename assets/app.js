@@ -0,0 +1,379 @@
+/*
+ * Clientside callbacks, registered in application.py.  The lookup tables
+ * they need (luts.client_luts) are written into the page as window.nwtLuts.
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    nwt: {
+        /*
+         * Move the highlight marker (trace 1) to the selected community,
+         * reading its coordinates from the static places trace (trace 0)
+         * already on the map, so no request goes to the server.
+         */
+        highlightCommunity: function (community, figure) {
+            if (community === null || community === undefined || !figure) {
+                return window.dash_clientside.no_update;
+            }
+            var places = figure.data[0];
+            var highlight = Object.assign({}, figure.data[1], {
+                lat: [places.lat[community]],
+                lon: [places.lon[community]],
+                text: places.text[community],
+                customdata: [places.customdata[community]],
+            });
+            return Object.assign({}, figure, { data: [places, highlight] });
+        },
+
+        /* Disable months selector when "All months" is selected */
+        disableMonthDropdown: function (values) {
+            return Boolean(values && values.length);
+        },
+
+        /* Return a string containing the graph title */
+        plotTitle: function (location, variable, start, end, annual, months) {
+            var luts = window.nwtLuts;
+            var title = location + "<br>";
+            var monthsFragment = "";
+            if (annual) {
+                title += "Decadal Annual Mean ";
+            } else {
+                title += "Decadal Monthly Mean ";
+                var sorted = (months || []).slice().sort(function (a, b) {
+                    return a - b;
+                });
+                monthsFragment =
+                    "<br>" +
+                    sorted
+                        .map(function (month) {
+                            return luts.months_lut[month];
+                        })
+                        .join(", ");
+                if (sorted.length > 1) {
+                    monthsFragment += " Averaged";
+                }
+            }
+            return (
+                title +
+                luts.variables_lut[variable] +
+                ", " +
+                start +
+                "-" +
+                end +
+                monthsFragment
+            );
+        },
+
+        /*
+         * Round to one decimal place exactly as Python's round(x, 1) does,
+         * like store.round_tenths: ties of the inexact x * 10 are broken
+         * by its rounding error, other halves go to the even neighbour.
+         */
+        roundTenths: function (x) {
+            var high = x * 8;
+            var low = x * 2;
+            var scaled = high + low;
+            var error = high - (scaled - (scaled - high)) + (low - (scaled - high));
+            var floor = Math.floor(scaled);
+            var fraction = scaled - floor;
+            var rounded;
+            if (fraction === 0.5 && error !== 0) {
+                rounded = floor + (error > 0 ? 1 : 0);
+            } else if (fraction === 0.5) {
+                rounded = floor % 2 === 0 ? floor : floor + 1;
+            } else {
+                rounded = fraction > 0.5 ? floor + 1 : floor;
+            }
+            return rounded / 10;
+        },
+
+        /*
+         * Fetch the data bundle for a community (see
+         * ClimateStore.community_bundle), decoding its values to numbers,
+         * with null where there is no data.
+         */
+        loadBundle: function (community) {
+            if (community === null || community === undefined) {
+                return window.dash_clientside.no_update;
+            }
+            return fetch(window.nwtLuts.bundle_url + community + ".json")
+                .then(function (response) {
+                    return response.json();
+                })
+                .then(function (bundle) {
+                    var bytes = atob(bundle.tenths);
+                    var view = new DataView(new ArrayBuffer(bytes.length));
+                    for (var i = 0; i < bytes.length; i++) {
+                        view.setUint8(i, bytes.charCodeAt(i));
+                    }
+                    var values = new Array(bytes.length / 2);
+                    for (var j = 0; j < values.length; j++) {
+                        var tenths = view.getInt16(j * 2, true);
+                        values[j] = tenths === bundle.missing ? null : tenths / 10;
+                    }
+                    delete bundle.tenths;
+                    bundle.values = values;
+                    return bundle;
+                });
+        },
+
+        /*
+         * Build the same traces as update_graph from a community's bundle:
+         * one per model/scenario, or the range and median over the models
+         * per scenario, averaging the months when more than one is selected.
+         */
+        buildTraces: function (bundle, yearRange, scenarios, models, months, allCheck, variable, modelDisplay) {
+            if (!bundle) {
+                return window.dash_clientside.no_update;
+            }
+            var luts = window.nwtLuts;
+            var nwt = window.dash_clientside.nwt;
+            if (allCheck && allCheck.length) {
+                months = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12];
+            }
+
+            // Positions of the selected labels, in label order
+            function positions(labels, keys) {
+                var found = [];
+                labels.forEach(function (label, position) {
+                    if ((keys || []).indexOf(label) >= 0) {
+                        found.push(position);
+                    }
+                });
+                return found;
+            }
+            var m = positions(bundle.model, models);
+            var s = positions(bundle.scenario, scenarios);
+            var mo = positions(bundle.month, months);
+            var y = [];
+            bundle.year.forEach(function (year, position) {
+                if (year >= yearRange[0] && year <= yearRange[1]) {
+                    y.push(position);
+                }
+            });
+            var v = bundle.variable.indexOf(variable);
+            var shape = bundle.shape;
+
+            function value(mi, si, yi, moi) {
+                return bundle.values[
+                    (((mi * shape[1] + si) * shape[2] + yi) * shape[3] + moi) * shape[4] + v
+                ];
+            }
+
+            // A model/scenario's value for a year: the selected month, or
+            // the months summed in calendar order and averaged like
+            // store.mean_over_months
+            function mean(mi, si, yi) {
+                if (mo.length === 1) {
+                    return value(mi, si, yi, mo[0]);
+                }
+                var total = 0;
+                var count = 0;
+                mo.forEach(function (month, k) {
+                    var x = value(mi, si, yi, month);
+                    var term = x === null ? 0 : x;
+                    total = k === 0 ? term : total + term;
+                    count += x === null ? 0 : 1;
+                });
+                return count ? nwt.roundTenths(total / count) : null;
+            }
+
+            var traces = [];
+            if (modelDisplay === "ensemble") {
+                // Minimum, median and maximum over the models, like store.ensemble
+                s.forEach(function (si) {
+                    var xs = [];
+                    var low = [];
+                    var middle = [];
+                    var high = [];
+                    y.forEach(function (yi) {
+                        var found = m
+                            .map(function (mi) {
+                                return mean(mi, si, yi);
+                            })
+                            .filter(function (x) {
+                                return x !== null;
+                            })
+                            .sort(function (a, b) {
+                                return a - b;
+                            });
+                        var n = found.length;
+                        if (n) {
+                            xs.push(bundle.year[yi]);
+                            low.push(found[0]);
+                            middle.push(nwt.roundTenths((found[(n - 1) >> 1] + found[n >> 1]) / 2));
+                            high.push(found[n - 1]);
+                        }
+                    });
+                    if (xs.length) {
+                        var scenario = bundle.scenario[si];
+                        var name = luts.scenarios_lut[scenario];
+                        var colors = luts.scenario_colors[scenario];
+                        traces.push(
+                            {
+                                type: "scatter",
+                                x: xs,
+                                y: high,
+                                name: name + " model maximum",
+                                legendgroup: scenario,
+                                showlegend: false,
+                                line: { color: colors.line, width: 0 },
+                                mode: "lines",
+                            },
+                            {
+                                type: "scatter",
+                                x: xs,
+                                y: low,
+                                name: name + " model range",
+                                legendgroup: scenario,
+                                fill: "tonexty",
+                                fillcolor: colors.fill,
+                                line: { color: colors.line, width: 0 },
+                                mode: "lines",
+                            },
+                            {
+                                type: "scatter",
+                                x: xs,
+                                y: middle,
+                                name: name + " model median",
+                                legendgroup: scenario,
+                                line: { color: colors.line, width: 2 },
+                                mode: "lines",
+                            }
+                        );
+                    }
+                });
+                return traces;
+            }
+
+            // One series per model/scenario
+            m.forEach(function (mi) {
+                s.forEach(function (si) {
+                    var xs = [];
+                    var ys = [];
+                    y.forEach(function (yi) {
+                        var result = mean(mi, si, yi);
+                        if (result !== null) {
+                            xs.push(bundle.year[yi]);
+                            ys.push(result);
+                        }
+                    });
+                    if (xs.length) {
+                        var model = bundle.model[mi];
+                        var scenario = bundle.scenario[si];
+                        traces.push({
+                            type: "scatter",
+                            x: xs,
+                            y: ys,
+                            name: luts.models_lut[model] + " " + luts.scenarios_lut[scenario],
+                            line: { color: luts.ms_colors[model][scenario], width: 2 },
+                            mode: "lines",
+                        });
+                    }
+                });
+            });
+            return traces;
+        },
+
+        /* Show the comparison section's controls and graph once opened */
+        showComparison: function (toggle) {
+            return { display: toggle && toggle.length ? "" : "none" };
+        },
+
+        /*
+         * The comparison inputs, as update_comparison's arguments, while
+         * the section is open; no update (so no request) while it's closed.
+         */
+        comparisonSelection: function (toggle, communities, model, scenario, yearRange, months, allCheck, variable) {
+            if (!toggle || !toggle.length) {
+                return window.dash_clientside.no_update;
+            }
+            return [communities, model, scenario, yearRange, months, allCheck, variable];
+        },
+
+        /* Draw the traces update_comparison computed for `selection` */
+        renderComparison: function (traces, selection) {
+            if (!traces || !selection) {
+                return window.dash_clientside.no_update;
+            }
+            var model = selection[1];
+            var scenario = selection[2];
+            var yearRange = selection[3];
+            var months = selection[4];
+            var allCheck = selection[5];
+            var variable = selection[6];
+            var luts = window.nwtLuts;
+            var title = window.dash_clientside.nwt.plotTitle(
+                luts.models_lut[model] + " " + luts.scenarios_lut[scenario],
+                variable,
+                yearRange[0],
+                yearRange[1],
+                Boolean(allCheck && allCheck.length),
+                months
+            );
+            return {
+                data: traces,
+                layout: Object.assign({}, luts.graph_layout, {
+                    title: title,
+                    yaxis: { title: luts.yaxis_titles[variable] },
+                }),
+            };
+        },
+
+        /*
+         * Links to the export endpoint for the data behind the graph, as
+         * CSV and JSON.  Empty selections are sent empty (e.g. "model="),
+         * since the endpoint reads missing parameters as "everything".
+         */
+        exportLinks: function (community, yearRange, scenarios, models, months, allCheck, variable) {
+            var params = [
+                "community=" + community,
+                "start=" + yearRange[0],
+                "end=" + yearRange[1],
+                "variable=" + variable,
+            ];
+            function add(name, values) {
+                if (!values || !values.length) {
+                    params.push(name + "=");
+                }
+                (values || []).forEach(function (value) {
+                    params.push(name + "=" + encodeURIComponent(value));
+                });
+            }
+            add("scenario", scenarios);
+            add("model", models);
+            if (allCheck && allCheck.length) {
+                params.push("annual=1");
+            } else {
+                add("month", months);
+            }
+            var query = "?" + params.join("&");
+            var url = window.nwtLuts.export_url;
+            return [url + "csv" + query, url + "json" + query];
+        },
+
+        /*
+         * Draw the traces computed by update_graph, adding the title and
+         * layout for the selection they were computed for.
+         */
+        renderGraph: function (traces, community, yearRange, months, allCheck, variable) {
+            if (!traces) {
+                return window.dash_clientside.no_update;
+            }
+            var luts = window.nwtLuts;
+            var title = window.dash_clientside.nwt.plotTitle(
+                luts.community_names[community],
+                variable,
+                yearRange[0],
+                yearRange[1],
+                Boolean(allCheck && allCheck.length),
+                months
+            );
+            return {
+                data: traces,
+                layout: Object.assign({}, luts.graph_layout, {
+                    title: title,
+                    yaxis: { title: luts.yaxis_titles[variable] },
+                }),
+            };
+        },
+    },
+});
@@ -0,0 +1,200 @@
+"""
+Latency benchmark for the Dash callbacks, run without a browser.
+
+Drives update_graph (bypassing its cache), the month averaging and the
+map click callback over a grid of inputs: every community, 1/3/12 months,
+1-6 models, 1-3 scenarios, both variables and several year ranges, also
+with the models shown as an ensemble range (2-6 models).  The
+community comparison runs over groups of 1-46 communities, with and
+without the territory-wide mean.  Reports p50/p95/p99 latency, the mean and largest
+peak memory allocated per call and the mean size and serialization time of
+the JSON response, and compares p95 against a saved baseline.
+
+    python benchmarks/bench_callbacks.py                  # compare to baseline
+    python benchmarks/bench_callbacks.py --save-baseline  # record a new one
+"""
+# pylint: disable=invalid-name, import-error, wrong-import-position
+import argparse
+import inspect
+import itertools
+import json
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root)
+sys.path.insert(0, root)
+os.environ.setdefault("MAPBOX_ACCESS_TOKEN", "")
+
+import luts
+import application
+
+baseline_fn = os.path.join(root, "benchmarks", "baseline.json")
+
+month_selections = [[7], [12, 1, 2], list(range(1, 13))]
+year_ranges = [[2000, 2300], [2000, 2100], [2100, 2300]]
+models = list(luts.models_lut)
+scenarios = list(luts.scenarios_lut)
+variables = list(luts.variables_lut)
+
+
+def graph_inputs():
+    """ The grid of update_graph inputs, as positional argument tuples. """
+    for community, months, n_models, n_scenarios, variable, year_range in itertools.product(
+        range(len(luts.community_names)),
+        month_selections,
+        range(1, len(models) + 1),
+        range(1, len(scenarios) + 1),
+        variables,
+        year_ranges,
+    ):
+        all_check = ["all"] if len(months) == 12 else []
+        yield (
+            community,
+            year_range,
+            scenarios[:n_scenarios],
+            models[:n_models],
+            list(months),
+            all_check,
+            variable,
+        )
+
+
+def average_months(community, year_range, scenario_values, model_values, months, all_check, variable):
+    """ Just the month averaging step of update_graph. """
+    return application.data.average_months(
+        luts.community_names[community],
+        model_values,
+        scenario_values,
+        year_range,
+        months,
+        variable,
+    )
+
+
+def comparison_inputs():
+    """ The grid of update_comparison inputs, as positional argument tuples. """
+    positions = list(range(len(luts.community_names)))
+    for size, mean, model, scenario, months, variable in itertools.product(
+        [1, 5, 20, len(positions)],
+        [False, True],
+        models,
+        scenarios,
+        month_selections,
+        variables,
+    ):
+        all_check = ["all"] if len(months) == 12 else []
+        communities = positions[:size] + (["mean"] if mean else [])
+        yield (communities, model, scenario, [2000, 2300], list(months), all_check, variable)
+
+
+def map_inputs():
+    """ A click on every community, as map callback arguments. """
+    for position, name in enumerate(luts.community_names):
+        yield ({"points": [{"text": name, "customdata": position}]},)
+
+
+# name: (function, inputs, whether its result is a callback response)
+benchmarks = {
+    "update_graph": (inspect.unwrap(application.update_graph), graph_inputs, True),
+    "update_graph_ensemble": (
+        inspect.unwrap(application.update_graph),
+        lambda: (i + ("ensemble",) for i in graph_inputs() if len(i[3]) > 1),
+        True,
+    ),
+    "average_months": (average_months, lambda: (i for i in graph_inputs() if len(i[4]) > 1), False),
+    "update_comparison": (inspect.unwrap(application.update_comparison), comparison_inputs, True),
+    "update_mine_site_dropdown": (
+        inspect.unwrap(application.update_mine_site_dropdown),
+        map_inputs,
+        True,
+    ),
+}
+
+
+def run(func, inputs, response, sample):
+    """
+    Time every call, then trace the memory allocated while running every
+    `sample`th input (tracing slows calls down too much to do both at once).
+    For callbacks (`response`), also time serializing those results the way
+    Dash does.
+    """
+    inputs = list(inputs())
+    timings = []
+    for args in inputs:
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+
+    traced = inputs[::sample]
+    peaks = []
+    sizes = []
+    serialize_timings = []
+    tracemalloc.start()
+    for args in traced:
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        func(*args)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+
+    for args in traced if response else []:
+        result = func(*args)
+        start = time.perf_counter()
+        sizes.append(len(to_json_plotly(result)))
+        serialize_timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings) * 1000
+    return {
+        "calls": len(inputs),
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "p99_ms": round(float(np.percentile(timings, 99)), 3),
+        "mean_alloc_kib": round(float(np.mean(peaks)) / 1024, 1),
+        "peak_alloc_kib": round(float(np.max(peaks)) / 1024, 1),
+        "json_kib": round(float(np.mean(sizes)) / 1024, 2) if response else "-",
+        "json_ms": round(float(np.mean(serialize_timings)) * 1000, 3) if response else "-",
+    }
+
+
+def main():
+    """ Run the benchmarks and compare them with (or save) the baseline. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save-baseline", action="store_true", help="write results to benchmarks/baseline.json")
+    parser.add_argument("--sample", type=int, default=50, help="trace memory on every Nth input")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = {
+        name: run(func, inputs, response, args.sample)
+        for name, (func, inputs, response) in benchmarks.items()
+    }
+
+    baseline = {}
+    if os.path.exists(baseline_fn) and not args.save_baseline:
+        with open(baseline_fn, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    columns = ["calls", "p50_ms", "p95_ms", "p99_ms", "mean_alloc_kib", "peak_alloc_kib", "json_kib", "json_ms"]
+    print(f"{'callback':<28}" + "".join(f"{column:>15}" for column in columns))
+    regressions = []
+    for name, result in results.items():
+        print(f"{name:<28}" + "".join(f"{result[column]:>15}" for column in columns))
+        if name in baseline and result["p95_ms"] > baseline[name]["p95_ms"] * (1 + args.tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms vs baseline {baseline[name]['p95_ms']} ms")
+
+    if args.save_baseline:
+        with open(baseline_fn, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {baseline_fn}")
+    elif regressions:
+        print("Slower than baseline:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Import-time benchmark: how long `import application` takes in a fresh
+interpreter, the cold start of every new worker before it serves anything.
+
+Runs `python -X importtime -c "import application"` a few times (with the
+warm-up skipped, see WARM_UP in the README) and reports the median
+cumulative and self time of `application` and of each module it imports
+directly.  Fails when the total is over the budget, when a module that
+should load on first use (pandas, the plotly figure classes) is imported at
+startup, or when the total is slower than the saved baseline.
+
+    python benchmarks/bench_import.py                  # compare to baseline
+    python benchmarks/bench_import.py --save-baseline  # record a new one
+"""
+# pylint: disable=invalid-name
+import argparse
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+baseline_fn = os.path.join(root, "benchmarks", "import_baseline.json")
+
+# Cumulative time `import application` may take, in milliseconds
+budget_ms = 750
+
+# Modules only the callbacks need, imported on their first call
+lazy_modules = ("pandas", "pyarrow", "plotly.basedatatypes", "plotly.validator_cache")
+
+
+def import_times():
+    """
+    One `-X importtime` run: (self, cumulative) microseconds by module for
+    `application` and its direct imports, and every module imported.
+    """
+    env = dict(os.environ, WARM_UP="0")
+    env.setdefault("MAPBOX_ACCESS_TOKEN", "")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import application"],
+        cwd=root,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        imported.add(name)
+        # A module's direct imports are listed, indented once, before it
+        if depth == 1:
+            times[name] = (int(self_us), int(cumulative_us))
+        elif depth == 0:
+            if name == "application":
+                times[name] = (int(self_us), int(cumulative_us))
+                break
+            times = {}
+    return times, imported
+
+
+def main():
+    """ Run the benchmark and compare it with (or save) the baseline. """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save-baseline", action="store_true", help="write results to benchmarks/import_baseline.json")
+    parser.add_argument("--runs", type=int, default=5, help="interpreters to start")
+    parser.add_argument("--budget-ms", type=float, default=budget_ms, help="allowed cumulative import time")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    imported = set.union(*(run[1] for run in runs))
+    names = sorted(
+        set.intersection(*(set(run[0]) for run in runs)),
+        key=lambda name: -runs[0][0][name][1],
+    )
+    results = {
+        name: {
+            "self_ms": round(float(np.median([run[0][name][0] for run in runs])) / 1000, 1),
+            "cumulative_ms": round(float(np.median([run[0][name][1] for run in runs])) / 1000, 1),
+        }
+        for name in names
+    }
+
+    baseline = {}
+    if os.path.exists(baseline_fn) and not args.save_baseline:
+        with open(baseline_fn, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'module':<40}{'self_ms':>15}{'cumulative_ms':>15}{'baseline_ms':>15}")
+    for name, result in results.items():
+        before = baseline.get(name, {}).get("cumulative_ms", "-")
+        print(f"{name:<40}{result['self_ms']:>15}{result['cumulative_ms']:>15}{before:>15}")
+
+    total = results["application"]["cumulative_ms"]
+    problems = []
+    if total > args.budget_ms:
+        problems.append(f"import application took {total} ms, over the {args.budget_ms} ms budget")
+    for name in sorted(set(lazy_modules) & imported):
+        problems.append(f"{name} is imported at startup")
+    if "application" in baseline and total > baseline["application"]["cumulative_ms"] * (1 + args.tolerance):
+        problems.append(f"import application took {total} ms vs baseline {baseline['application']['cumulative_ms']} ms")
+
+    if args.save_baseline:
+        with open(baseline_fn, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {baseline_fn}")
+    if problems:
+        print("Import time problems:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
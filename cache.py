@@ -0,0 +1,253 @@
+"""
+Caches for callback results: an in-process LRU, optionally backed by a
+store shared between the WSGI worker processes on one host.
+"""
+# pylint: disable=invalid-name, import-error
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from plotly.io.json import to_json_plotly
+
+
+class FileBackend:
+    """
+    Shared cache holding one JSON file per key in `directory`, which every
+    worker on the host can read.  Point it at a tmpfs such as /dev/shm to
+    keep it in memory.  Files are replaced atomically, so readers never see
+    a partial write; files older than `ttl` seconds (if set) are ignored.
+
+    Writers prune the directory at most every `prune_interval` seconds:
+    expired files are deleted, then the oldest beyond `max_entries` (0 for
+    no limit), so it doesn't keep a file for every selection ever made.
+    """
+
+    def __init__(self, directory, ttl=0, max_entries=4096, prune_interval=60):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._prune_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest + ".json")
+
+    def get(self, key):
+        """ Return the stored string for `key`, or None. """
+        path = self._path(key)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key, payload):
+        """ Store the string `payload` under `key`. """
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        now = time.monotonic()
+        with self._prune_lock:
+            due = now >= self._next_prune
+            if due:
+                self._next_prune = now + self.prune_interval
+        if due:
+            self.prune()
+
+    def prune(self):
+        """
+        Delete expired entries, then the oldest ones beyond `max_entries`.
+        Other workers may be pruning too, so files can vanish meanwhile.
+        """
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                if self.ttl and now - mtime > self.ttl:
+                    os.remove(entry.path)
+                    continue
+            except OSError:
+                continue
+            entries.append((mtime, entry.path))
+
+        if self.max_entries and len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[: len(entries) - self.max_entries]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class MemoryBackend:
+    """
+    Stand-in for FileBackend that keeps everything in a dict,
+    for tests and single-process runs.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        """ Return the stored string for `key`, or None. """
+        return self.entries.get(key)
+
+    def set(self, key, payload):
+        """ Store the string `payload` under `key`. """
+        self.entries[key] = payload
+
+
+class FigureCache:
+    """
+    Least-recently-used cache with a per-entry time to live.
+
+    Holds at most `max_entries` results (0 disables caching, the shared
+    backend included), taking up at most `max_bytes` (0 for no limit)
+    measured as the length of their figure JSON, and drops entries older
+    than `ttl` seconds (0 means they never expire).  Counts hits, misses
+    and evictions so they can be reported.
+
+    With a `shared` backend (see FileBackend), local misses are looked up
+    there before being recomputed, and new values are written to it as
+    figure JSON so other workers can reuse them.  `namespace` keeps the
+    keys of different callbacks apart in the shared store.
+    """
+
+    def __init__(self, max_entries=256, ttl=0, shared=None, namespace="", max_bytes=0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.ttl = ttl
+        self.shared = shared
+        self.namespace = namespace
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """ Return the cached value for `key`, or None. """
+        if self.max_entries <= 0:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value, size = entry
+                if not expires or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.size -= size
+
+        if self.shared is not None:
+            payload = self.shared.get(self._shared_key(key))
+            if payload is not None:
+                value = json.loads(payload)
+                self._store(key, value, len(payload))
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """ Store `value` locally and, if configured, in the shared backend. """
+        if self.max_entries <= 0:
+            return
+        payload = ""
+        if self.shared is not None or self.max_bytes:
+            payload = to_json_plotly(value)
+        self._store(key, value, len(payload))
+        if self.shared is not None:
+            self.shared.set(self._shared_key(key), payload)
+
+    def _shared_key(self, key):
+        return self.namespace + ":" + repr(key)
+
+    def _store(self, key, value, size):
+        """
+        Store `value`, whose JSON is `size` long, locally, evicting the
+        least recently used entries.
+        """
+        if self.max_entries <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[2]
+            self._entries[key] = (expires, value, size)
+            self.size += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes and self.size > self.max_bytes)
+            ):
+                self.size -= self._entries.popitem(last=False)[1][2]
+                self.evictions += 1
+
+    def clear(self):
+        """ Drop all entries and reset the counters. """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = self.shared_hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """ Counters and current size, as a dict. """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def memoize(self, make_key):
+        """
+        Decorator caching a function's result under `make_key(*args)`,
+        so equivalent inputs share one entry.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = make_key(*args)
+                value = self.get(key)
+                if value is None:
+                    value = func(*args)
+                    self.set(key, value)
+                return value
+
+            return wrapper
+
+        return decorator
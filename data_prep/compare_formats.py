@@ -0,0 +1,60 @@
+"""
+Compare size and load time of the data formats built by make_pickle.py
+against the original long-format pickle.  Run from the repository root
+after make_pickle.py.
+"""
+# pylint: disable=invalid-name, import-error
+import os
+import sys
+import tempfile
+import timeit
+import pandas as pd
+
+sys.path.insert(0, os.getcwd())
+from store import ClimateStore, read_columnar
+
+files = [
+    'data/tas_pr_nwt_decadal_mean_historical_melted.csv',
+    'data/tas_pr_nwt_decadal_mean_rcp45_melted.csv',
+    'data/tas_pr_nwt_decadal_mean_rcp60_melted.csv',
+    'data/tas_pr_nwt_decadal_mean_rcp85_melted.csv',
+]
+
+# The old data.pickle, rebuilt the way make_pickle.py used to
+pickle_path = os.path.join(tempfile.mkdtemp(), 'data.pickle')
+pd.concat(
+    [pd.read_csv(file, index_col=0) for file in files], ignore_index=True
+).to_pickle(pickle_path)
+
+loaders = {
+    'pickle (all rows)': (
+        [pickle_path],
+        lambda: pd.read_pickle(pickle_path),
+    ),
+    'parquet (all rows)': (
+        ['data.parquet'],
+        lambda: read_columnar(),
+    ),
+    'parquet (1 community, 2 scenarios, 1 variable)': (
+        ['data.parquet'],
+        lambda: read_columnar(
+            communities=['Yellowknife'],
+            scenarios=['rcp60', 'rcp85'],
+            columns=['year', 'month', 'tas', 'model', 'scenario'],
+        ),
+    ),
+    'npy cube (memory-mapped)': (
+        ['data.npy', 'data.json'],
+        lambda: ClimateStore.load('data'),
+    ),
+    'npy cube (read into memory)': (
+        ['data.npy', 'data.json'],
+        lambda: ClimateStore.load('data', mmap=False),
+    ),
+}
+
+print(f"{'format':<50}{'size (KiB)':>12}{'load (ms)':>12}")
+for name, (paths, load) in loaders.items():
+    size = sum(os.path.getsize(path) for path in paths) / 1024
+    best = min(timeit.repeat(load, number=1, repeat=5)) * 1000
+    print(f"{name:<50}{size:>12.0f}{best:>12.1f}")
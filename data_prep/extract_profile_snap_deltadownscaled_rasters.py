@@ -18,20 +18,24 @@ def list_data( path ):
 	out_df = df.sort_values(['year', 'month'])
 	return out_df['fn'].tolist()
 
-def extract_data( fn, row, col ):
+def extract_data( fn, rows, cols ):
+	# read only the window spanning all of the points, then sample them all at once
+	window = Window.from_slices( (rows.min(), rows.max()+1), (cols.min(), cols.max()+1) )
 	with rasterio.open( fn ) as rst:
-		arr = rst.read(1)
-	return arr[ row,col ]
-
-def run_extraction( files, row, col ):
-	# multiprocess
-	f = partial(extract_data, row=row, col=col)
-	pool = mp.Pool( ncpus )
-	extracted = pool.map( f, files )
-	pool.close()
-	pool.join()
-	pool = None
-	return extracted
+		arr = rst.read( 1, window=window )
+	return arr[ rows-rows.min(), cols-cols.min() ]
+
+def extract_files( files, rowcols, pool ):
+	# multiprocess -- one task per file, sampling every point in it.
+	#	values are yielded in file order as soon as they arrive
+	rows = np.array([ row for row,col in rowcols ])
+	cols = np.array([ col for row,col in rowcols ])
+	f = partial(extract_data, rows=rows, cols=cols)
+	start = time.time()
+	for values in pool.imap( f, files, chunksize=max(1, len(files) // (ncpus*4)) ):
+		yield values
+	elapsed = time.time() - start
+	print( 'extracted {} files in {:.1f}s ({:.1f} files/sec)'.format( len(files), elapsed, len(files)/elapsed ) )
 
 def get_rowcol_from_point( x, y, transform ):
 	# get the row col using the affine transform
@@ -39,42 +43,68 @@ def get_rowcol_from_point( x, y, transform ):
 	col, row = int(col), int(row)
 	return row, col
 
-def make_melted( dat, time_index, variable, model, scenario ):
-	# prep a data frame
-	df = pd.DataFrame( dat ).copy()
-	df['year'] = [year for month, year in time_index]
-	df['month'] = [month for month, year in time_index]
-	# melt it
-	melted = df.melt(id_vars=['year', 'month'],var_name='community',value_name=variable)
-	# add in some other columns that will be useful when 
-	#	concatenating the group melted dataframes later on...
-	melted['scenario'] = scenario
-	melted['model'] = model
-	return melted
-
-def run_group( model, scenario, files_dict, rowcols ):
-	names = rowcols.index.tolist()
-	variables = list(files_dict.keys())
-	# extract the data
-	extracted = {variable:{names[idx]:run_extraction( files_dict[variable], rowcol[0], rowcol[1] ) 
-					for idx,rowcol in enumerate(rowcols)} for variable in variables}
-	# make year_list
-	files = files_dict[variables[0]] # grab the first one.  It is assumed that variables within a group have the same time dimension
-	years = int(files[0].split('.')[0].split('_')[-1]), int(files[-1].split('.')[0].split('_')[-1])
-	all_years = np.repeat(np.arange(years[0], years[1]+1 ), 12)
-	all_months = np.concatenate([np.arange(1,13) for i in np.unique(all_years)])
-	dates = list(zip(all_months,all_years))
-
-	# melt each of the variables
-	melted_data = [make_melted(extracted[v],dates,v,model,scenario) for v in variables]
-	return melted_data
+def get_month_year( fn ):
+	# month and year are the last two parts of the filename
+	month, year = os.path.basename( fn ).split('.')[0].split('_')[-2:]
+	return int(month), int(year)
+
+def hash_inputs( files, rowcols ):
+	# partitions are keyed by their input files, when those were last modified
+	#	and the points sampled from them
+	h = hashlib.sha1( json.dumps( rowcols ).encode('utf-8') )
+	for fn in files:
+		st = os.stat( fn )
+		h.update( '{} {} {}\n'.format( fn, st.st_mtime_ns, st.st_size ).encode('utf-8') )
+	return h.hexdigest()
+
+def accumulate_partition( files, extracted, npoints ):
+	# sum up the monthly values of one model/scenario/variable partition per decade
+	#	as they arrive from the `extracted` iterator, skipping nodata values
+	years = [ get_month_year(fn)[1] for fn in files ]
+	decades = np.arange( min(years)//10*10, max(years)//10*10+1, 10 )
+
+	sums = np.zeros( (len(decades), 12, npoints) )
+	counts = np.zeros( sums.shape, dtype=int )
+	nyears = np.zeros( (len(decades), 12), dtype=int ) # files seen per decade/month
+	for fn in files:
+		values = next( extracted ).astype( float )
+		month, year = get_month_year( fn )
+		didx = (year//10*10 - decades[0]) // 10
+		valid = values != -9999
+		sums[ didx, month-1, valid ] += values[ valid ]
+		counts[ didx, month-1 ] += valid
+		nyears[ didx, month-1 ] += 1
+	return decades, sums, counts, nyears
+
+def make_decadal( decades, sums, counts, nyears, variables, names, model, scenario ):
+	# `sums` and `counts` are stacked by variable.  decadal means melted to one row per community/decade/month, keeping
+	#	only the span of decades that have a full 10 years of data
+	full_decades = decades[ (nyears == 10).any(axis=1) ]
+	keep = (decades >= full_decades.min()) & (decades <= full_decades.max())
+	with np.errstate( invalid='ignore' ):
+		means = sums[:, keep] / counts[:, keep]
+
+	order = sorted( range(len(names)), key=lambda i: names[i] )
+	ndecades = keep.sum()
+	df = pd.DataFrame({
+		'year': np.tile( np.repeat(decades[keep], 12), len(order) ),
+		'month': np.tile( np.arange(1,13), len(order)*ndecades ),
+	})
+	for vidx, variable in enumerate(variables):
+		# (decade, month, point) -> (community, decade, month)
+		df[variable] = means[vidx][..., order].transpose(2,0,1).ravel()
+	df['scenario'] = scenario
+	df['model'] = model
+	df['community'] = np.repeat( np.array(names)[order], ndecades*12 )
+	return df
 
 
 if __name__ == '__main__':
-	import os, glob, pyproj, itertools
+	import os, glob, pyproj, itertools, time, json, hashlib
 	import numpy as np
 	import rasterio
 	from rasterio.features import rasterize
+	from rasterio.windows import Window
 	import pandas as pd
 	import multiprocessing as mp
 	from shapely.geometry import Point
@@ -111,48 +141,54 @@ if __name__ == '__main__':
 	projected_pts = communities.apply(lambda x: pyproj.Proj('EPSG:3338')(x.longitude,x.latitude), axis=1)
 	rowcols = projected_pts.apply(lambda x: get_rowcol_from_point( x[0], x[1], transform=meta['transform']) )
 	
-	# update the args with the rowcols
-	_ = [i.update(rowcols=rowcols) for i in args]
-
-	# run the extractions for each of the groups in serial
-	all_extracted = {' '.join([kw['model'],kw['scenario']]):run_group( **kw ) for kw in args}
-
-	print('WRITING TO CSVS')
-	out = {}
-	for key in list(all_extracted.keys()):
-		model, scenario = str(key).split()
-		tas,pr = all_extracted[key]
-		tas['pr'] = pr['pr']
-		tas[ tas == -9999 ] = np.nan
-
-		# make decadals
-		comm_list = []
-		for community, sub_df in tas.groupby('community'):
-			# group it and figure out the full decades
-			decades_grouper = [str(month)+'-'+str(year)[:3]+'0' for year,month in zip(sub_df.year, sub_df.month)]
-			full_decades = np.unique([i.split('-')[1] for i,j in zip(*np.unique(decades_grouper, return_counts=True)) if j == 10]).astype(int)
-			decadal_avg = sub_df.groupby(decades_grouper).mean()
-			
-			# build the output 'melted' dataframe
-			monyear = pd.DataFrame([ i.split('-') for i in decadal_avg.index.tolist() ], columns=['month','year']).astype(int)
-			decadal_avg['month'] = monyear.month.tolist()
-			decadal_avg['year'] = monyear.year.tolist()
-			decadal_avg = decadal_avg.sort_values(['year','month']).reset_index(drop=True)
-			decadal_avg['scenario'] = scenario
-			decadal_avg['model'] = model
-			decadal_avg['community'] = community
-
-			# slice it to only the full decades.
-			decadal_avg = decadal_avg[(decadal_avg.year >= full_decades.min()) & (decadal_avg.year <= full_decades.max())]
-			comm_list = comm_list + [decadal_avg]
-
-		out[key] = pd.concat(comm_list).reset_index(drop=True)
-	
-	# now stack all the models for a given scenario	
-	for scenario in scenarios:
-		keylist = [key for key in list(out.keys()) if scenario in key]
-		out_df = pd.concat([out[key] for key in keylist])
-		out_df['tas'] = out_df['tas'].round(1)
-		out_df['pr'] = out_df['pr'].round(0)
+	# each (model, scenario, variable) partition is extracted into its own decadal
+	# sums, which are kept along with a hash of its inputs.  Only the partitions
+	# whose input files changed since the last run need to be extracted again
+	names = rowcols.index.tolist()
+	partition_path = os.path.join( output_path, 'partitions' )
+	os.makedirs( partition_path, exist_ok=True )
+	manifest_fn = os.path.join( partition_path, 'manifest.json' )
+	manifest = {}
+	if os.path.exists( manifest_fn ):
+		with open( manifest_fn ) as f:
+			manifest = json.load( f )
+
+	def partition_fn( model, scenario, variable ):
+		return os.path.join( partition_path, '{}_{}_{}.npz'.format( model, scenario, variable ) )
+
+	partitions = { (kw['model'], kw['scenario'], variable):kw['files_dict'][variable] for kw in args for variable in variables }
+	hashes = { key:hash_inputs( files, rowcols.tolist() ) for key, files in partitions.items() }
+	stale = [ key for key in partitions if manifest.get( '_'.join(key) ) != hashes[key] or not os.path.exists( partition_fn(*key) ) ]
+	print( '{} of {} partitions changed'.format( len(stale), len(partitions) ) )
+
+	# extract every changed partition with one persistent pool, opening each file only
+	# once for all of the communities.  Decadal sums are accumulated as the values
+	# stream in, so memory use doesn't grow with the number of partitions
+	if stale:
+		all_files = [ fn for key in stale for fn in partitions[key] ]
+		with mp.Pool( ncpus ) as pool:
+			extracted = extract_files( all_files, rowcols.tolist(), pool )
+			for key in stale:
+				decades, sums, counts, nyears = accumulate_partition( partitions[key], extracted, len(names) )
+				np.savez( partition_fn(*key), decades=decades, sums=sums, counts=counts, nyears=nyears )
+				# update the manifest as we go so an interrupted run keeps its progress
+				manifest[ '_'.join(key) ] = hashes[key]
+				with open( manifest_fn, 'w' ) as f:
+					json.dump( manifest, f, indent=2 )
+
+			# finish the generator so it reports the throughput
+			for _ in extracted:
+				pass
+
+	# rewrite the CSVs for scenarios with changed partitions from the saved sums
+	for scenario in [ scenario for scenario in scenarios if any( key[1] == scenario for key in stale ) ]:
+		print( 'WRITING {} TO CSV'.format( scenario ) )
 		out_fn = os.path.join( output_path, 'tas_pr_nwt_decadal_mean_{}_melted.csv'.format(scenario))
-		out_df.to_csv( out_fn )
+		for idx, model in enumerate(models):
+			saved = [ np.load( partition_fn( model, scenario, variable ) ) for variable in variables ]
+			sums = np.stack([ i['sums'] for i in saved ])
+			counts = np.stack([ i['counts'] for i in saved ])
+			out_df = make_decadal( saved[0]['decades'], sums, counts, saved[0]['nyears'], variables, names, model, scenario )
+			out_df['tas'] = out_df['tas'].round(1)
+			out_df['pr'] = out_df['pr'].round(0)
+			out_df.to_csv( out_fn, mode='a' if idx else 'w', header=not idx )
@@ -4,9 +4,13 @@ Tiny script to prepare placenames with lat/lon.
 
 # pylint: disable=invalid-name, import-error, line-too-long, too-many-arguments
 
+import json
 import pandas as pd
 
-df = pd.read_csv('nwt_point_locations.csv')
-df.index = df['name']
-del df.index.name
-df[['latitude','longitude']].to_pickle('../community_places.pickle')
+df = pd.read_csv('nwt_point_locations.csv', float_precision='round_trip')
+
+# Plain JSON, so the app reads it without importing pandas
+places = {column: df[column].tolist() for column in ['name', 'latitude', 'longitude']}
+with open('../community_places.json', 'w', encoding='utf-8') as f:
+    json.dump(places, f, ensure_ascii=False, indent=1)
+    f.write('\n')
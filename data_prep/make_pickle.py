@@ -1,12 +1,42 @@
 """
-Take melted data and produce a binary pickle to be use by the Dash app.
+Take melted data and produce the dense data cube used by the Dash app.
+
+The cube is written to `data.npy` as an array shaped
+(community, model, scenario, year, month, variable), with the labels
+along each axis in `data.json`, see `store.py`.
+
+Annual and seasonal (DJF, MAM, JJA, SON) means are precomputed into
+`data_presets.npy`, shaped (community, model, scenario, year, preset,
+variable), with the months of each preset listed in `data.json`.
+
+Trend and anomaly statistics for every series -- each month and preset of
+every community/model/scenario/variable -- go to `data_stats.npy`, shaped
+(community, model, scenario, period, variable, stat): the slope per
+century, the late-century change from the historical baseline and the
+spread of that change across the individual models.
+
+If pyarrow is installed, the melted rows are also written to
+`data.parquet` with compact types (categorical strings, int16/int8,
+float32) and one row group per community/scenario, so readers can
+skip what they don't need, see `store.read_columnar`.
 """
 # pylint: disable=invalid-name, import-error
 import os
-from collections import defaultdict
-import pickle
+import sys
+import json
+import hashlib
+import numpy as np
 import pandas as pd
 
+sys.path.insert(0, os.getcwd())
+from store import mean_over_months
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
 
 files = [
     'data/tas_pr_nwt_decadal_mean_historical_melted.csv',
@@ -36,4 +66,192 @@ output_data = pd.concat(
     ignore_index=True
 )
 
-output_data.to_pickle('data.pickle')
+# Label each axis of the cube with the sorted distinct values found in the data
+variables = ['tas', 'pr']
+labels = {
+    axis: np.sort(np.array(output_data[axis].unique().tolist()))
+    for axis in ['community', 'model', 'scenario', 'year', 'month']
+}
+labels['variable'] = np.array(variables)
+
+# Integer position of every row along each axis
+codes = tuple(
+    np.searchsorted(labels[axis], output_data[axis])
+    for axis in ['community', 'model', 'scenario', 'year', 'month']
+)
+
+# Month averages for the most requested selections, averaged exactly like
+# the app does on the fly so both paths give the same numbers
+presets = {
+    'annual': list(range(1, 13)),
+    'DJF': [12, 1, 2],
+    'MAM': [3, 4, 5],
+    'JJA': [6, 7, 8],
+    'SON': [9, 10, 11],
+}
+
+
+def preset_means(block):
+    """ Preset averages of `block`, whose last two axes are (month, variable). """
+    return np.stack(
+        [
+            mean_over_months(
+                np.moveaxis(block[..., np.searchsorted(labels['month'], sorted(months)), :], -1, -2)
+            )
+            for months in presets.values()
+        ],
+        axis=-2,
+    )
+
+
+# Fingerprint the rows of every (model, scenario, variable) partition
+partitions = {}
+for (model, scenario), group in output_data.groupby(['model', 'scenario']):
+    for variable in variables:
+        hashed = pd.util.hash_pandas_object(
+            group[['community', 'year', 'month', variable]], index=False
+        )
+        partitions[f'{model}|{scenario}|{variable}'] = hashlib.sha1(
+            hashed.to_numpy().tobytes()
+        ).hexdigest()
+
+previous = {}
+if all(os.path.exists(f) for f in ['data.npy', 'data_presets.npy', 'data.json']):
+    with open('data.json', encoding='utf-8') as f:
+        previous = json.load(f)
+
+unchanged_axes = all(
+    previous.get(axis) == labels[axis].tolist() for axis in labels
+) and previous.get('preset') == presets
+
+if unchanged_axes and 'partitions' in previous:
+    # Merge only the partitions that changed into the existing arrays
+    values = np.load('data.npy')
+    preset_values = np.load('data_presets.npy')
+    # Partitions gone from the CSVs count as changed, so they are cleared
+    changed = [
+        key for key in {**previous['partitions'], **partitions}
+        if previous['partitions'].get(key) != partitions.get(key)
+    ]
+    for key in changed:
+        model, scenario, variable = key.split('|')
+        m = np.searchsorted(labels['model'], model)
+        s = np.searchsorted(labels['scenario'], scenario)
+        v = variables.index(variable)
+        rows = ((output_data['model'] == model) & (output_data['scenario'] == scenario)).to_numpy()
+        c, _, _, y, mo = (code[rows] for code in codes)
+        values[:, m, s, ..., v] = np.nan
+        values[c, m, s, y, mo, v] = output_data.loc[rows, variable].to_numpy()
+        preset_values[:, m, s, ..., v] = preset_means(values[:, m, s, ..., v:v + 1])[..., 0]
+    print(f'Merged {len(changed)} of {len(partitions)} changed partitions')
+else:
+    values = np.full(
+        tuple(len(labels[axis]) for axis in labels),
+        np.nan
+    )
+    values[codes] = output_data[variables].to_numpy()
+    preset_values = preset_means(values)
+    print(f'Built all {len(partitions)} partitions')
+
+# Windows (first and last decade, inclusive) the statistics are taken over
+stat_windows = {
+    'baseline': [1960, 1980],
+    'trend': [2010, 2090],
+    'late': [2070, 2090],
+}
+stat_names = ['trend', 'change', 'spread']
+
+
+def nan_mean(block, axis):
+    """ Mean of `block` along `axis`, ignoring NaNs (NaN where all are). """
+    present = ~np.isnan(block)
+    with np.errstate(invalid='ignore'):
+        return np.where(present, block, 0).sum(axis) / present.sum(axis)
+
+
+def series_stats(periods):
+    """
+    Statistics for every series in `periods`, shaped (community, model,
+    scenario, year, period, variable), in a few whole-array reductions:
+    the least-squares slope per century over the trend window, the change
+    of the late window's mean from the historical baseline's mean and the
+    range of that change across the individual models (not 5ModelAvg).
+    Historical series get NaN.
+    """
+    years = labels['year']
+
+    def in_window(name):
+        return (years >= stat_windows[name][0]) & (years <= stat_windows[name][1])
+
+    historical = np.searchsorted(labels['scenario'], 'historical')
+    baseline = nan_mean(periods[:, :, historical, in_window('baseline')], axis=2)
+    change = nan_mean(periods[:, :, :, in_window('late')], axis=3) - baseline[:, :, np.newaxis]
+
+    block = periods[:, :, :, in_window('trend')]
+    present = ~np.isnan(block)
+    x = np.where(present, years[in_window('trend')][:, np.newaxis, np.newaxis], 0.0)
+    y = np.where(present, block, 0.0)
+    count = present.sum(axis=3, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = np.where(present, x - x.sum(axis=3, keepdims=True) / count, 0.0)
+        dy = np.where(present, y - y.sum(axis=3, keepdims=True) / count, 0.0)
+        trend = (dx * dy).sum(axis=3) / (dx * dx).sum(axis=3) * 100
+
+    individual = labels['model'] != '5ModelAvg'
+    spread = np.fmax.reduce(change[:, individual], axis=1) - np.fmin.reduce(
+        change[:, individual], axis=1
+    )
+    spread = np.broadcast_to(spread[:, np.newaxis], change.shape)
+
+    stats = np.stack([trend, change, spread], axis=-1)
+    stats[:, :, historical] = np.nan
+    return stats
+
+
+# Periods are the single months followed by the presets
+periods = [str(month) for month in labels['month']] + list(presets)
+stats = series_stats(np.concatenate([values, preset_values], axis=4))
+
+np.save('data.npy', values)
+np.save('data_presets.npy', preset_values)
+np.save('data_stats.npy', stats)
+with open('data.json', 'w', encoding='utf-8') as f:
+    json.dump(
+        {
+            **{axis: labels[axis].tolist() for axis in labels},
+            'preset': presets,
+            'period': periods,
+            'stat': stat_names,
+            'stat_windows': stat_windows,
+            'partitions': partitions,
+        },
+        f,
+        ensure_ascii=False,
+    )
+
+if pq is not None:
+    columnar = output_data.astype(
+        {
+            'year': 'int16',
+            'month': 'int8',
+            'tas': 'float32',
+            'pr': 'float32',
+            'scenario': pd.CategoricalDtype(labels['scenario']),
+            'model': pd.CategoricalDtype(labels['model']),
+            'community': pd.CategoricalDtype(labels['community']),
+        }
+    ).sort_values(['community', 'scenario', 'model', 'year', 'month'])
+
+    # One row group per community/scenario, indexed in the file metadata
+    # so readers can pick row groups without scanning any data
+    groups = columnar.groupby(['community', 'scenario'], observed=True)
+    row_groups = [f'{community}|{scenario}' for community, scenario in groups.groups]
+    schema = pa.Schema.from_pandas(columnar, preserve_index=False)
+    schema = schema.with_metadata(
+        {**schema.metadata, b'row_groups': json.dumps(row_groups).encode('utf-8')}
+    )
+    with pq.ParquetWriter('data.parquet', schema) as writer:
+        for _, group in groups:
+            writer.write_table(
+                pa.Table.from_pandas(group, schema=schema, preserve_index=False)
+            )
@@ -4,10 +4,10 @@ NWT Climate Explorer
 
 # pylint: disable=invalid-name, import-error, line-too-long, too-many-arguments
 from datetime import datetime
-import plotly.graph_objs as go
 from dash import dcc, html
 import dash_dangerously_set_inner_html as ddsih
 import luts
+from responses import asset_url
 
 
 # Helper functions for GUI.
@@ -45,7 +45,12 @@ def wrap_in_field(label, control, className=""):
     )
 
 
-map_figure = go.Figure(data=luts.places_trace, layout=luts.map_layout)
+# The highlight trace is moved to the selected community in the browser,
+# see highlightCommunity in assets/app.js
+map_figure = {
+    "data": [luts.places_trace, luts.highlight_trace(luts.default_community)],
+    "layout": luts.map_layout,
+}
 
 header = ddsih.DangerouslySetInnerHTML(
     f"""
@@ -79,11 +84,11 @@ footer = ddsih.DangerouslySetInnerHTML(
         <div class="columns">
             <div class="logos column is-one-fifth">
                 <a href="https://www.gov.nt.ca/">
-                    <img src="{luts.path_prefix}assets/NWT.svg" />
+                    <img src="{asset_url('NWT.svg')}" />
                 </a>
                 <br>
                 <a href="https://uaf.edu/uaf/">
-                    <img src="{luts.path_prefix}assets/UAF.svg" />
+                    <img src="{asset_url('UAF.svg')}" />
                 </a>
             </div>
             <div class="column content is-size-5">
@@ -111,10 +116,10 @@ communities_dropdown_field = html.Div(
                 dcc.Dropdown(
                     id="communities-dropdown",
                     options=[
-                        {"label": community[0], "value": index}
-                        for index, community in luts.communities.iterrows()
+                        {"label": name, "value": position}
+                        for position, name in enumerate(luts.community_names)
                     ],
-                    value=[45],  # yellowknife
+                    value=luts.default_community,
                 )
             ],
         ),
@@ -133,7 +138,7 @@ scenarios_checkbox_field = wrap_in_field(
                 luts.scenarios_lut,
             )
         ),
-        value=["rcp60", "rcp85"],
+        value=luts.default_selection["scenarios"],
     ),
 )
 
@@ -149,7 +154,7 @@ variable_toggle_field = wrap_in_field(
                 luts.variables_lut,
             )
         ),
-        value="tas",
+        value=luts.default_selection["variable"],
     ),
 )
 
@@ -176,7 +181,7 @@ months_field = html.Div(
                             luts.months_lut,
                         )
                     ),
-                    value=[12, 1, 2],
+                    value=luts.default_selection["months"],
                     multi=True,
                     disabled=False,
                 )
@@ -192,11 +197,25 @@ models_field = wrap_in_field(
         options=list(
             map(lambda k: {"label": luts.models_lut[k], "value": k}, luts.models_lut)
         ),
-        value=["NCAR-CCSM4"],
+        value=luts.default_selection["models"],
         multi=True,
     ),
 )
 
+model_display_field = wrap_in_field(
+    "Show models as",
+    dcc.RadioItems(
+        labelClassName="radio",
+        className="control",
+        id="model-display",
+        options=[
+            {"label": "Individual lines", "value": "lines"},
+            {"label": "Range and median", "value": "ensemble"},
+        ],
+        value="lines",
+    ),
+)
+
 form_fields = html.Div(
     className="columns form",
     children=[
@@ -217,6 +236,7 @@ form_fields = html.Div(
                 variable_toggle_field,
                 months_field,
                 models_field,
+                model_display_field,
                 scenarios_checkbox_field,
             ],
         ),
@@ -264,6 +284,21 @@ main_layout = wrap_in_section(
                             "displaylogo": False,
                         },
                     ),
+                    # Traces from the server, drawn by renderGraph in assets/app.js
+                    dcc.Store(id="graph-traces"),
+                    # Data for the selected community when CLIENTSIDE_RENDERING=1
+                    dcc.Store(id="community-bundle"),
+                    # Precomputed trend statistics, see update_stats_table
+                    html.Div(id="stats-table"),
+                    html.P(
+                        className="export-links",
+                        children=[
+                            "Download the data in this graph: ",
+                            html.A("CSV", id="export-csv", href=""),
+                            " | ",
+                            html.A("JSON", id="export-json", href=""),
+                        ],
+                    ),
                     html.Div(
                         className="form date-range-selector",
                         children=[
@@ -275,7 +310,7 @@ main_layout = wrap_in_section(
                                 min=2000,
                                 max=2300,
                                 step=20,
-                                value=[2000, 2300],
+                                value=luts.default_selection["year_range"],
                             ),
                         ],
                     ),
@@ -285,6 +320,87 @@ main_layout = wrap_in_section(
     )
 )
 
+# The comparison is only computed once opened, so changes to the form
+# above don't also update a graph nobody looks at
+comparison_layout = wrap_in_section(
+    [
+        html.H3("Compare locations", className="title is-4"),
+        html.P(
+            "One model and scenario across several locations, for the variable, months and date range selected above."
+        ),
+        dcc.Checklist(
+            id="compare-toggle",
+            labelClassName="checkbox",
+            options=[{"label": " Show the comparison", "value": "open"}],
+            value=[],
+        ),
+        html.Div(
+            id="compare-body",
+            className="columns form",
+            style={"display": "none"},
+            children=[
+                html.Div(
+                    className="column is-one-third",
+                    children=[
+                        wrap_in_field(
+                            "Locations",
+                            dcc.Dropdown(
+                                id="compare-communities",
+                                options=[{"label": luts.territory_mean_label, "value": "mean"}]
+                                + [
+                                    {"label": name, "value": position}
+                                    for position, name in enumerate(luts.community_names)
+                                ],
+                                value=[luts.default_community, "mean"],
+                                multi=True,
+                            ),
+                        ),
+                        wrap_in_field(
+                            "Model",
+                            dcc.Dropdown(
+                                id="compare-model",
+                                options=[
+                                    {"label": luts.models_lut[k], "value": k}
+                                    for k in luts.models_lut
+                                ],
+                                value=luts.default_selection["compare_model"],
+                                clearable=False,
+                            ),
+                        ),
+                        wrap_in_field(
+                            "Scenario",
+                            dcc.RadioItems(
+                                labelClassName="radio",
+                                className="control",
+                                id="compare-scenario",
+                                options=[
+                                    {"label": luts.scenarios_lut[k], "value": k}
+                                    for k in luts.scenarios_lut
+                                ],
+                                value=luts.default_selection["compare_scenario"],
+                            ),
+                        ),
+                    ],
+                ),
+                html.Div(
+                    className="column",
+                    children=[
+                        dcc.Graph(
+                            id="compare-graph",
+                            config={"displaylogo": False, "scrollZoom": False},
+                        ),
+                        # The selection to compare while open (see comparisonSelection
+                        # in assets/app.js) and the traces update_comparison
+                        # computes for it, drawn by renderComparison
+                        dcc.Store(id="comparison-selection"),
+                        dcc.Store(id="comparison-traces"),
+                    ],
+                ),
+            ],
+        ),
+    ]
+)
+
 help_text = wrap_in_section(
     dcc.Markdown(
         """
@@ -314,4 +430,4 @@ Source data used in this tool can be downloaded [here](https://catalog.snap.uaf.
     container_classes="is-size-5 content",
 )
 
-layout = html.Div(children=[header, main_layout, help_text, footer])
+layout = html.Div(children=[header, main_layout, comparison_layout, help_text, footer])
@@ -1,7 +1,5 @@
 import os
 import json
-import plotly.graph_objs as go
-import pandas as pd
 
 
 # The next config sets a relative base path so we can deploy
@@ -57,27 +55,119 @@ ms_colors = {
     "NCAR-CCSM4": {"rcp45": "#C35817", "rcp60": "#6F4E37", "rcp85": "#493D26"},
 }
 
-communities = pd.read_pickle("community_places.pickle")
-communities = communities.reset_index()
-communities = communities.rename(columns={"index": "name"})
+territory_mean_label = "Territory-wide mean"
+
+yaxis_titles = {"tas": "Degrees Celsius", "pr": "Millimeters"}
+units = {"tas": "°C", "pr": "mm"}
+
+# Everything in the graph layout but the title and y axis title,
+# which depend on the selection
+graph_layout = {
+    "autosize": False,
+    "showlegend": True,
+    "height": 650,
+    "margin": {"t": 100, "b": 130},
+    "xaxis": {"title": "Year"},
+    "annotations": [
+        {
+            "x": 0.5,
+            "y": -0.20,
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "text": "These plots are useful for examining possible trends over time, rather than for precisely predicting values.",
+        },
+        {
+            "x": 0.5,
+            "y": -0.24,
+            "xref": "paper",
+            "yref": "paper",
+            "showarrow": False,
+            "text": "Credit: Scenarios Network for Alaska + Arctic Planning, University of Alaska Fairbanks.",
+        },
+    ],
+}
+
+# Scenario colors for the ensemble range (fill) and median (line)
+scenario_colors = {
+    "rcp45": {"line": "#2B547E", "fill": "rgba(43, 84, 126, 0.25)"},
+    "rcp60": {"line": "#C35817", "fill": "rgba(195, 88, 23, 0.25)"},
+    "rcp85": {"line": "#800517", "fill": "rgba(128, 5, 23, 0.25)"},
+}
+
+# Names and coordinates of the communities, from data_prep/make_community_places.py
+with open("community_places.json", encoding="utf-8") as f:
+    community_places = json.load(f)
+
+# Community lookups both ways, built once: the position of a community
+# (dropdown value, map point index) <-> its name (as used in the data)
+community_names = community_places["name"]
+community_positions = {name: position for position, name in enumerate(community_names)}
+default_community = community_positions["Yellowknife"]
+
+# Initial values of the other graph controls (see gui.py)
+default_selection = {
+    "year_range": [2000, 2300],
+    "scenarios": ["rcp60", "rcp85"],
+    "models": ["NCAR-CCSM4"],
+    "months": [12, 1, 2],
+    "variable": "tas",
+    "compare_model": "5ModelAvg",
+    "compare_scenario": "rcp85",
+}
+
+# Lookup tables the clientside callbacks (assets/app.js) need,
+# written into the page once as window.nwtLuts
+client_luts = {
+    "variables_lut": variables_lut,
+    "scenarios_lut": scenarios_lut,
+    "months_lut": months_lut,
+    "models_lut": models_lut,
+    "ms_colors": ms_colors,
+    "scenario_colors": scenario_colors,
+    "community_names": community_names,
+    "yaxis_titles": yaxis_titles,
+    "graph_layout": graph_layout,
+    "bundle_url": path_prefix + "bundles/",
+    "export_url": path_prefix + "export.",
+}
 
 mapbox_access_token = os.environ["MAPBOX_ACCESS_TOKEN"]
 
 # This trace is shared so we can highlight specific communities.
-places_trace = go.Scattermapbox(
-    lat=communities.loc[:, "latitude"],
-    lon=communities.loc[:, "longitude"],
-    mode="markers",
-    marker={"size": 10, "color": "rgb(80,80,80)"},
-    line={"color": "rgb(0, 0, 0)", "width": 2},
-    text=communities.loc[:, "name"],
-    hoverinfo="text",
-)
-
-map_layout = go.Layout(
-    autosize=True,
-    hovermode="closest",
-    mapbox=dict(style="carto-positron", zoom=3.25, center=dict(lat=66.75, lon=-125)),
-    showlegend=False,
-    margin=dict(l=0, r=0, t=0, b=0),
-)
+# The map is made of plain dicts, like the graph, so building it doesn't
+# import and run the plotly validators at startup.
+places_trace = {
+    "type": "scattermapbox",
+    "lat": community_places["latitude"],
+    "lon": community_places["longitude"],
+    "mode": "markers",
+    "marker": {"size": 10, "color": "rgb(80,80,80)"},
+    "line": {"color": "rgb(0, 0, 0)", "width": 2},
+    "text": community_names,
+    "customdata": list(range(len(community_names))),
+    "hoverinfo": "text",
+}
+
+map_layout = {
+    "autosize": True,
+    "hovermode": "closest",
+    "mapbox": {"style": "carto-positron", "zoom": 3.25, "center": {"lat": 66.75, "lon": -125}},
+    "showlegend": False,
+    "margin": {"l": 0, "r": 0, "t": 0, "b": 0},
+}
+
+
+def highlight_trace(community):
+    """ Marker highlighting one community, drawn over `places_trace`. """
+    return {
+        "type": "scattermapbox",
+        "lat": [community_places["latitude"][community]],
+        "lon": [community_places["longitude"][community]],
+        "mode": "markers",
+        "marker": {"size": 20, "color": "rgb(207, 38, 47)"},
+        "line": {"color": "rgb(0, 0, 0)", "width": 2},
+        "text": community_names[community],
+        "customdata": [community],
+        "hoverinfo": "text",
+    }
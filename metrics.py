@@ -0,0 +1,188 @@
+"""
+Opt-in timing of callback stages, served as Prometheus text or JSON.
+
+Set METRICS_ENABLED=1 to record.  When disabled, `timed` hands back a shared
+no-op context manager, so instrumented code pays for one attribute lookup
+and a function call per stage.
+"""
+# pylint: disable=invalid-name, import-error
+import functools
+import os
+import threading
+import time
+from flask import Response, jsonify, request
+
+enabled = os.getenv("METRICS_ENABLED") == "1"
+
+# Upper bounds (seconds) of the latency histogram buckets
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """ Cumulative latency histogram in the Prometheus style. """
+
+    def __init__(self):
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """ Record one duration. """
+        with self._lock:
+            self.count += 1
+            self.sum += seconds
+            for ix, bound in enumerate(buckets):
+                if seconds <= bound:
+                    self.counts[ix] += 1
+
+    def snapshot(self):
+        """ Counts per bucket bound (plus "+Inf"), total count and sum. """
+        with self._lock:
+            return {
+                "buckets": dict(zip([str(b) for b in buckets] + ["+Inf"], self.counts + [self.count])),
+                "count": self.count,
+                "sum": self.sum,
+            }
+
+
+histograms = {}
+stats_sources = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(callback, stage):
+    """ The histogram for one stage of a callback, created on first use. """
+    key = (callback, stage)
+    if key not in histograms:
+        with _histograms_lock:
+            histograms.setdefault(key, Histogram())
+    return histograms[key]
+
+
+class _Timer:
+    def __init__(self, target):
+        self.target = target
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.target.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def timed(callback, stage):
+    """ Context manager timing one stage of a callback, if enabled. """
+    if not enabled:
+        return _null_timer
+    return _Timer(histogram(callback, stage))
+
+
+def timed_callback(callback):
+    """ Decorator timing a whole callback (cache lookups included) as "total". """
+
+    def decorator(func):
+        if not enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            with timed(callback, "total"):
+                return func(*args)
+
+        return wrapper
+
+    return decorator
+
+
+def register_stats(name, source):
+    """ Report the counters returned by `source()` (e.g. cache stats) as `name`. """
+    stats_sources[name] = source
+
+
+def _label(value):
+    """ `value` escaped for a Prometheus label value. """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text():
+    """ All metrics in the Prometheus text exposition format. """
+    lines = [
+        "# HELP nwt_callback_seconds Time spent in each stage of the Dash callbacks.",
+        "# TYPE nwt_callback_seconds histogram",
+    ]
+    for (callback, stage), hist in sorted(histograms.items()):
+        labels = f'callback="{_label(callback)}",stage="{_label(stage)}"'
+        snapshot = hist.snapshot()
+        for bound, count in snapshot["buckets"].items():
+            lines.append(f'nwt_callback_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f"nwt_callback_seconds_sum{{{labels}}} {snapshot['sum']}")
+        lines.append(f"nwt_callback_seconds_count{{{labels}}} {snapshot['count']}")
+
+    lines += [
+        "# HELP nwt_stats Counters reported by the app's caches.",
+        "# TYPE nwt_stats gauge",
+    ]
+    for name, source in sorted(stats_sources.items()):
+        for stat, value in source().items():
+            lines.append(f'nwt_stats{{source="{_label(name)}",stat="{_label(stat)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def as_dict():
+    """ All metrics as a JSON-friendly dict. """
+    return {
+        "callbacks": {
+            f"{callback}.{stage}": hist.snapshot()
+            for (callback, stage), hist in sorted(histograms.items())
+        },
+        "stats": {name: source() for name, source in sorted(stats_sources.items())},
+    }
+
+
+def init_app(dash_app, path):
+    """
+    Serve the metrics at `path` on the server of `dash_app` (Prometheus
+    text, or JSON with ?format=json) and time every Dash callback request,
+    which includes serializing the response.  Requests for outputs that
+    aren't callbacks of `dash_app` are timed together as "unknown", so
+    made-up outputs can't add histograms.  Does nothing unless enabled.
+    """
+    if not enabled:
+        return
+    server = dash_app.server
+
+    @server.route(path)
+    def metrics_endpoint():
+        if request.args.get("format") == "json":
+            return jsonify(as_dict())
+        return Response(prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+    @server.before_request
+    def start_timer():
+        request.environ["nwt.start"] = time.perf_counter()
+
+    @server.after_request
+    def observe_request(response):
+        if request.path.endswith("_dash-update-component") and "nwt.start" in request.environ:
+            body = request.get_json(silent=True)
+            output = body.get("output") if isinstance(body, dict) else None
+            if not isinstance(output, str) or output not in dash_app.callback_map:
+                output = "unknown"
+            histogram(output, "request").observe(
+                time.perf_counter() - request.environ["nwt.start"]
+            )
+        return response
@@ -0,0 +1,173 @@
+"""
+Runs the expensive callbacks' computations, merging identical calls that
+are in flight at the same time and dropping those a newer request from the
+same page has superseded.
+
+Calls are identified by a key (the figure cache key), so concurrent
+requests for one selection -- several visitors on the default view, or a
+browser clicking back and forth between communities -- share a single
+computation instead of each occupying a server thread with it.
+
+With a thread pool (CALLBACK_THREADS), at most that many computations run
+at once however many requests the server's threads are handling, so the
+other threads stay free to serve assets.  A computation still waiting for
+a pool thread is dropped when the same page sends a new request for the
+same callback: its request answers "no update", as Dash would discard that
+stale response anyway.  Each page load picks a random id that the Dash
+renderer adds to its callback requests (see `init_app`), so tabs open on
+the same app don't supersede each other's requests.
+"""
+# pylint: disable=invalid-name, import-error
+import functools
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from dash.exceptions import PreventUpdate
+from flask import has_request_context, request
+
+# Field of the callback requests holding the id of the page sending them
+page_field = "nwt_page"
+
+renderer = f"""
+var nwtPage = Array.prototype.map.call(
+    window.crypto.getRandomValues(new Uint32Array(4)),
+    function (n) {{ return n.toString(36); }}
+).join("-");
+var renderer = new DashRenderer({{
+    request_pre: function (payload) {{ payload.{page_field} = nwtPage; }},
+}});
+"""
+
+
+def _page():
+    """ The id of the page load making the current callback request, if any. """
+    if not has_request_context():
+        return None
+    body = request.get_json(silent=True)
+    return body.get(page_field) if isinstance(body, dict) else None
+
+
+class CallbackPool:
+    """
+    Computes each keyed call once at a time: callers asking for a key that
+    is already being computed wait for that result.  With `max_workers`
+    the computations run on a thread pool of that size, otherwise in the
+    thread of the first caller.  Counts the calls computed, those merged
+    into one in flight and those dropped as superseded.
+    """
+
+    def __init__(self, max_workers=0):
+        self.max_workers = max_workers
+        self.executor = None
+        if max_workers > 0:
+            self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="callback")
+        self.computed = 0
+        self.coalesced = 0
+        self.superseded = 0
+        # key -> Future of the computation in flight
+        self._inflight = {}
+        # (page, callback) -> (request token, Future) of its latest request
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def _future(self, key, func, args):
+        """ The computation in flight for `key`, started if there is none. """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            self.computed += 1
+            if self.executor is not None:
+                future = self.executor.submit(func, *args)
+            else:
+                future = Future()
+            self._inflight[key] = future
+        future.add_done_callback(functools.partial(self._forget, key))
+        return future, True
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    @staticmethod
+    def _compute(future, func, args):
+        """ Run a computation in this thread, handing its outcome to `future`. """
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(func(*args))
+        except Exception as exc:  # pylint: disable=broad-except
+            future.set_exception(exc)
+
+    def _supersede(self, name, token, future):
+        """
+        Record `future` as the latest for the page/callback `name`, and
+        cancel its previous request's computation unless it has started.
+        """
+        with self._lock:
+            previous = self._latest.get(name)
+            self._latest[name] = (token, future)
+        if self.executor is not None and previous is not None and previous[1] is not future:
+            previous[1].cancel()
+
+    def run(self, callback, key, func, *args):
+        """
+        The result of `func(*args)`, shared with concurrent calls for the
+        same `key`.  Raises PreventUpdate if a newer request from the same
+        page for `callback` dropped it before it started.
+        """
+        name = (_page(), callback)
+        token = object()
+        try:
+            while True:
+                future, owner = self._future(key, func, args)
+                if name[0] is not None:
+                    self._supersede(name, token, future)
+                if owner and self.executor is None:
+                    self._compute(future, func, args)
+                try:
+                    return future.result()
+                except CancelledError:
+                    if name[0] is not None and self._latest.get(name, (None,))[0] is not token:
+                        with self._lock:
+                            self.superseded += 1
+                        raise PreventUpdate from None
+                    # Dropped for another page that moved on; still wanted here
+        finally:
+            with self._lock:
+                if self._latest.get(name, (None,))[0] is token:
+                    del self._latest[name]
+
+    def coalesce(self, callback, make_key):
+        """
+        Decorator running a callback through `run`, under the key
+        `make_key(*args)` (e.g. the same key as its figure cache).
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                return self.run(callback, make_key(*args), func, *args)
+
+            return wrapper
+
+        return decorator
+
+    def stats(self):
+        """ Counters and the number of computations in flight, as a dict. """
+        with self._lock:
+            return {
+                "threads": self.max_workers if self.executor else 0,
+                "in_flight": len(self._inflight),
+                "computed": self.computed,
+                "coalesced": self.coalesced,
+                "superseded": self.superseded,
+            }
+
+    def init_app(self, dash_app):
+        """
+        With a thread pool, have the pages of `dash_app` send their id with
+        every callback request, so a page's requests can supersede each other.
+        """
+        if self.executor is not None:
+            dash_app.renderer = renderer
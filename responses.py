@@ -0,0 +1,193 @@
+"""
+Compression and HTTP caching for the Flask server behind the app.
+
+Text responses (callback JSON, the page, CSS/JS/SVG) are compressed with
+brotli, if the `brotli` package is installed, or gzip, whichever the client
+accepts.  Static files and data bundles are compressed once per version
+and kept in memory.
+
+Assets requested with a fingerprint -- the `?v=<content hash>` added by
+`asset_url`, or the `?m=<mtime>` Dash adds to the CSS/JS it includes -- may
+be cached for a year; other assets are revalidated with their ETag.  JSON
+from the Dash routes gets an ETag from its content and a 304 Not Modified
+when the client already has it.
+
+Set HTTP_COMPRESSION=0 when a proxy in front of the app compresses instead.
+"""
+# pylint: disable=invalid-name, import-error
+import functools
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+from dash.fingerprint import check_fingerprint
+from flask import request
+import luts
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+enabled = os.getenv("HTTP_COMPRESSION", "1") != "0"
+
+# Smaller bodies aren't worth the CPU or the header bytes
+min_size = 500
+compressible = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "image/svg+xml",
+)
+
+assets_folder = "assets"
+one_year = 31536000
+
+# Compressed static bodies by (path, etag, encoding); the query string and
+# the fingerprint of component suite paths are left out so clients can't
+# add entries with made-up parameters or fingerprints
+_static_bodies = {}
+_static_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def _content_hash(path, mtime):  # pylint: disable=unused-argument
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def fingerprint(filename):
+    """ Short hash of the contents of `filename` in the assets folder. """
+    path = os.path.join(assets_folder, filename)
+    return _content_hash(path, os.path.getmtime(path))
+
+
+def asset_url(filename):
+    """ URL of an asset, fingerprinted so browsers can cache it for good. """
+    return f"{luts.path_prefix}assets/{filename}?v={fingerprint(filename)}"
+
+
+def negotiate(accept_encoding):
+    """ The best encoding we can produce that the client accepts, or None. """
+    if brotli is not None and accept_encoding["br"]:
+        return "br"
+    if accept_encoding["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding, static=False):
+    """ `body` compressed with `encoding`, harder for static files. """
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if static else 5)
+    return gzip.compress(body, compresslevel=9 if static else 6, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    """ Compress an iterable of chunks as it is consumed. """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=5)
+        finish = compressor.finish
+        compress_chunk = compressor.process
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        finish = compressor.flush
+        compress_chunk = compressor.compress
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        compressed = compress_chunk(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def _replace_body(response, body):
+    """ Set the body, closing any file Flask was going to stream instead. """
+    close = getattr(response.response, "close", None)
+    if close is not None:
+        close()
+    response.direct_passthrough = False
+    response.set_data(body)
+
+
+def _is_fingerprinted(filename):
+    if "m" in request.args:
+        return True
+    try:
+        return request.args.get("v") == fingerprint(filename)
+    except OSError:
+        return False
+
+
+def init_app(server, routes_prefix):
+    """
+    Add compression, cache headers and ETags to the responses of the Flask
+    `server` whose Dash routes live under `routes_prefix`.
+    """
+    assets_path = routes_prefix + "assets/"
+    suites_path = routes_prefix + "_dash-component-suites/"
+    bundles_path = routes_prefix + "bundles/"
+    dash_routes = routes_prefix + "_dash-"
+
+    @server.after_request
+    def finish_response(response):
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return response
+
+        static = request.path.startswith((assets_path, suites_path, bundles_path))
+        if request.path.startswith(assets_path):
+            if _is_fingerprinted(request.path[len(assets_path):]):
+                response.headers["Cache-Control"] = f"public, max-age={one_year}, immutable"
+            else:
+                response.headers["Cache-Control"] = "no-cache"
+        elif request.path.startswith(dash_routes) and response.mimetype == "application/json":
+            response.add_etag()
+            if request.method == "GET":
+                response.headers["Cache-Control"] = "no-cache"
+
+        encoding = None
+        if enabled and response.mimetype.startswith(compressible):
+            response.vary.add("Accept-Encoding")
+            if response.content_length is None or response.content_length >= min_size:
+                encoding = negotiate(request.accept_encodings)
+
+        # Each encoding is a different representation, with its own ETag
+        etag = response.get_etag()[0]
+        if etag and encoding:
+            response.set_etag(f"{etag}-{encoding}")
+        if etag and response.get_etag()[0] in request.if_none_match:
+            response.status_code = 304
+            _replace_body(response, b"")
+            return response
+
+        # Streamed responses (exports) stay streamed
+        if encoding and response.is_streamed and not response.direct_passthrough:
+            response.response = compress_stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+        if encoding:
+            if static:
+                path = request.path
+                if path.startswith(suites_path):
+                    path = check_fingerprint(path)[0]
+                key = (path, etag, encoding)
+                with _static_lock:
+                    body = _static_bodies.get(key)
+                if body is None:
+                    response.direct_passthrough = False
+                    body = compress(response.get_data(), encoding, static=True)
+                    with _static_lock:
+                        _static_bodies[key] = body
+            else:
+                response.direct_passthrough = False
+                body = response.get_data()
+                if len(body) < min_size:
+                    return response
+                body = compress(body, encoding)
+            _replace_body(response, body)
+            response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,381 @@
+"""
+Dense, categorically-indexed store for the decadal climate data.
+
+`data_prep/make_pickle.py` writes the melted CSVs as a single array shaped
+(community, model, scenario, year, month, variable) to `data.npy`, and the
+labels along each axis (the categories the integer positions stand for) to
+`data.json`.  Lookups are integer slices into that array; combinations
+missing from the source data (e.g. 5ModelAvg past 2090) are NaN.
+
+The array is memory-mapped by default: every worker process maps the same
+file, so they share one copy in the page cache and loading deserializes
+nothing.  pandas, the slowest import of the app, is only imported by the
+queries that return DataFrames, on their first call.
+"""
+# pylint: disable=invalid-name, import-error, too-many-arguments, import-outside-toplevel
+import base64
+import json
+import os
+import numpy as np
+
+
+AXES = ("community", "model", "scenario", "year", "month", "variable")
+
+# Stands in for NaN in the int16 tenths of `ClimateStore.community_bundle`
+MISSING_TENTHS = -32768
+
+
+def round_tenths(values):
+    """
+    Round to one decimal place exactly as Python's `round(x, 1)` does.
+
+    `np.round` scales by 10 and rounds the (inexact) product, which differs
+    from Python's correctly-rounded result when the product lands on a .5
+    boundary, e.g. -5.55 (really -5.5499999...) -> -5.6 instead of -5.5.
+    The rounding error of the product is recovered exactly (x * 10 is the sum
+    of the exact products x * 8 and x * 2) and used to break those ties.
+    """
+    high, low = values * 8, values * 2
+    scaled = high + low
+    error = (high - (scaled - (scaled - high))) + (low - (scaled - high))
+    rounded = np.rint(scaled)
+    tie = (np.abs(scaled - rounded) == 0.5) & (error != 0)
+    rounded = np.where(tie, np.floor(scaled) + (error > 0), rounded)
+    return rounded / 10
+
+
+def memory_usage():
+    """
+    Resident and shared (file-backed) memory of this process in bytes,
+    from /proc/self/statm.  Returns None where that isn't available.
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            fields = f.read().split()
+    except OSError:
+        return None
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    return {"rss": int(fields[1]) * page_size, "shared": int(fields[2]) * page_size}
+
+
+def mean_over_months(block):
+    """
+    Average `block` over its last (month) axis ignoring NaNs, rounded to one
+    digit.  Months are summed in calendar order one at a time (reducing along
+    the leading axis of a contiguous copy), so the floating point result
+    matches the pandas row means this replaces bit for bit.
+    """
+    present = ~np.isnan(block)
+    by_month = np.ascontiguousarray(np.moveaxis(np.where(present, block, 0), -1, 0))
+    total = by_month.sum(axis=0)
+    count = present.sum(axis=-1)
+    with np.errstate(invalid="ignore"):
+        return round_tenths(total / count)
+
+
+class ClimateStore:
+    """
+    Wraps the dense data cube and the labels for each of its axes.
+
+    `presets` maps the sorted months of each precomputed average (annual and
+    the standard seasons) to its position along the preset axis of
+    `preset_values`, shaped (community, model, scenario, year, preset, variable).
+    """
+
+    def __init__(self, values, labels, preset_values=None, stats=None):
+        self.values = values
+        self.labels = {axis: np.array(labels[axis]) for axis in AXES}
+        # Label -> position along each axis
+        self.index = {
+            axis: {label: ix for ix, label in enumerate(labels[axis])} for axis in AXES
+        }
+        self.preset_values = preset_values
+        self.presets = {}
+        if preset_values is not None:
+            self.presets = {
+                tuple(sorted(months)): ix
+                for ix, months in enumerate(labels["preset"].values())
+            }
+        self.stats = stats
+        self.stat_names = labels.get("stat", [])
+        self.stat_windows = labels.get("stat_windows", {})
+        # Months -> position along the period axis of `stats`
+        self.periods = {}
+        for ix, period in enumerate(labels.get("period", [])):
+            months = labels["preset"].get(period, [int(period)] if period.isdigit() else None)
+            if months is not None:
+                self.periods[tuple(sorted(months))] = ix
+
+    @classmethod
+    def load(cls, path="data", mmap=True):
+        """
+        Read a store written by `data_prep/make_pickle.py` from `<path>.npy`,
+        `<path>_presets.npy`, `<path>_stats.npy` (if present) and
+        `<path>.json`.  With `mmap` off the arrays are read into this
+        process' private memory instead.
+        """
+        mmap_mode = "r" if mmap else None
+        values = np.load(path + ".npy", mmap_mode=mmap_mode)
+        preset_values = np.load(path + "_presets.npy", mmap_mode=mmap_mode)
+        stats = None
+        if os.path.exists(path + "_stats.npy"):
+            stats = np.load(path + "_stats.npy", mmap_mode=mmap_mode)
+        with open(path + ".json", encoding="utf-8") as f:
+            labels = json.load(f)
+        return cls(values, labels, preset_values, stats)
+
+    def _positions(self, axis, keys):
+        """
+        Positions of `keys` along `axis`, sorted, once each, silently
+        dropping unknown keys.
+        """
+        index = self.index[axis]
+        return np.array(sorted({index[key] for key in keys if key in index}), dtype=np.intp)
+
+    def _locate(self, community, models, scenarios, year_range, variable):
+        """ Positions along every axis but month for a selection. """
+        c = self.index["community"][community]
+        v = self.index["variable"][variable]
+        m = self._positions("model", models)
+        s = self._positions("scenario", scenarios)
+        return c, m, s, self._years(year_range), v
+
+    def _years(self, year_range):
+        """ Positions of the years from `year_range[0]` to `year_range[1]`. """
+        years = self.labels["year"]
+        begin, end = year_range
+        return np.arange(
+            years.searchsorted(begin, side="left"),
+            years.searchsorted(end, side="right"),
+        )
+
+    def _block(self, community, models, scenarios, year_range, months, variable):
+        """
+        Slice one community/variable out of the cube.  Returns the block shaped
+        (model, scenario, year, month) and the labels along each of its axes.
+        """
+        c, m, s, y, v = self._locate(
+            community, models, scenarios, year_range, variable
+        )
+        mo = self._positions("month", months)
+
+        block = np.asarray(self.values[c][np.ix_(m, s, y, mo)][..., v])
+        return block, (
+            self.labels["model"][m],
+            self.labels["scenario"][s],
+            self.labels["year"][y],
+            self.labels["month"][mo],
+        )
+
+    def select(self, community, models, scenarios, year_range, months, variable):
+        """
+        Return the melted rows (year, month, <variable>, scenario, model)
+        for one community, in the same layout as the old `data.pickle`.
+        """
+        import pandas as pd
+
+        block, labels = self._block(
+            community, models, scenarios, year_range, months, variable
+        )
+        index = pd.MultiIndex.from_product(
+            labels, names=["model", "scenario", "year", "month"]
+        )
+        selected = pd.DataFrame({variable: block.ravel()}, index=index).dropna()
+        return selected.reset_index()
+
+    def _means(self, c, m, s, y, mo, v):
+        """
+        Means over months `mo` for the communities at positions `c`, shaped
+        (community, model, scenario, year), in one indexing operation.
+        Annual and seasonal averages are read from the precomputed presets.
+        """
+        preset = self.presets.get(tuple(self.labels["month"][mo]))
+        if preset is not None:
+            return np.asarray(self.preset_values[np.ix_(c, m, s, y)][..., preset, v])
+        return mean_over_months(np.asarray(self.values[np.ix_(c, m, s, y, mo)][..., v]))
+
+    def average_months(
+        self, community, models, scenarios, year_range, months, variable
+    ):
+        """
+        Average the selected months together for every model/scenario at
+        once, one row per (model, scenario, year), rounded to one digit.
+        The month column holds a label like "avg_1_2_12" for grouping traces.
+        Annual and seasonal averages are read from the precomputed presets.
+        """
+        import pandas as pd
+
+        c, m, s, y, v = self._locate(
+            community, models, scenarios, year_range, variable
+        )
+        mo = self._positions("month", months)
+        means = self._means([c], m, s, y, mo, v)[0]
+
+        index = pd.MultiIndex.from_product(
+            [self.labels["model"][m], self.labels["scenario"][s], self.labels["year"][y]],
+            names=["model", "scenario", "year"],
+        )
+        averaged = pd.DataFrame({variable: means.ravel()}, index=index).dropna()
+        averaged["month"] = "_".join(["avg"] + [str(m) for m in self.labels["month"][mo]])
+        return averaged.reset_index()
+
+    def series(self, community, models, scenarios, year_range, months, variable):
+        """
+        The rows behind one graph: the selected months averaged together
+        when there is more than one (see `average_months`), else `select`.
+        """
+        if len(set(months)) > 1:
+            return self.average_months(
+                community, models, scenarios, year_range, months, variable
+            )
+        return self.select(community, models, scenarios, year_range, months, variable)
+
+    def ensemble(self, community, models, scenarios, year_range, months, variable):
+        """
+        The minimum, median and maximum of every scenario's series over the
+        selected models, from a single sort along the model axis (missing
+        values sort last).  Months are averaged as in `average_months`.
+        Returns rows (scenario, year, min, median, max) for the years any
+        selected model has data, rounded to one digit.
+        """
+        import pandas as pd
+
+        c, m, s, y, v = self._locate(
+            community, models, scenarios, year_range, variable
+        )
+        mo = self._positions("month", months)
+        means = self._means([c], m, s, y, mo, v)[0]
+        if not len(m):
+            # No models selected: a single model without data, so no rows
+            means = np.full((1,) + means.shape[1:], np.nan)
+
+        ordered = np.sort(means, axis=0)
+        count = (~np.isnan(means)).sum(axis=0)
+
+        def nth(n):
+            return np.take_along_axis(ordered, np.maximum(n, 0)[np.newaxis], axis=0)[0]
+
+        middle = round_tenths((nth((count - 1) // 2) + nth(count // 2)) / 2)
+        index = pd.MultiIndex.from_product(
+            [self.labels["scenario"][s], self.labels["year"][y]],
+            names=["scenario", "year"],
+        )
+        envelope = pd.DataFrame(
+            {
+                "min": ordered[0].ravel(),
+                "median": middle.ravel(),
+                "max": nth(count - 1).ravel(),
+            },
+            index=index,
+        )
+        return envelope.dropna().reset_index()
+
+    def _community_means(self, c, model, scenario, year_range, months, variable):
+        """
+        Means over `months` of one model/scenario for the communities at
+        positions `c`, shaped (community, year), and the year positions.
+        """
+        m = [self.index["model"][model]]
+        s = [self.index["scenario"][scenario]]
+        y = self._years(year_range)
+        mo = self._positions("month", months)
+        v = self.index["variable"][variable]
+        return self._means(c, m, s, y, mo, v)[:, 0, 0], y
+
+    def compare(self, communities, model, scenario, year_range, months, variable):
+        """
+        One model/scenario for several communities, fetched for all of them
+        in one indexing operation.  Returns rows (community, year,
+        <variable>) with the selected months averaged as in
+        `average_months` (a single month is returned as is).
+        """
+        import pandas as pd
+
+        c = self._positions("community", communities)
+        means, y = self._community_means(c, model, scenario, year_range, months, variable)
+        index = pd.MultiIndex.from_product(
+            [self.labels["community"][c], self.labels["year"][y]],
+            names=["community", "year"],
+        )
+        compared = pd.DataFrame({variable: means.ravel()}, index=index).dropna()
+        return compared.reset_index()
+
+    def territory_mean(self, model, scenario, year_range, months, variable):
+        """
+        Mean over every community of what `compare` returns for them, one
+        row per year (year, <variable>), rounded to one digit.
+        """
+        import pandas as pd
+
+        c = np.arange(len(self.labels["community"]))
+        means, y = self._community_means(c, model, scenario, year_range, months, variable)
+        # Averages over the last axis, here the communities
+        mean = mean_over_months(means.T)
+        territory = pd.DataFrame({"year": self.labels["year"][y], variable: mean})
+        return territory.dropna().reset_index(drop=True)
+
+    def series_stats(self, community, models, scenarios, months, variable):
+        """
+        The precomputed statistics (trend per century, change from the
+        historical baseline, spread of that change across models) of each
+        selected model/scenario, one row per series.  Only single months
+        and the presets have statistics: returns None for other month
+        selections, or when the store has none.
+        """
+        import pandas as pd
+
+        period = self.periods.get(tuple(sorted(set(months))))
+        if self.stats is None or period is None:
+            return None
+        c = self.index["community"][community]
+        v = self.index["variable"][variable]
+        m = self._positions("model", models)
+        s = self._positions("scenario", scenarios)
+        block = np.asarray(self.stats[c][np.ix_(m, s)][..., period, v, :])
+        index = pd.MultiIndex.from_product(
+            [self.labels["model"][m], self.labels["scenario"][s]],
+            names=["model", "scenario"],
+        )
+        stats = pd.DataFrame(
+            block.reshape(-1, len(self.stat_names)), index=index, columns=self.stat_names
+        )
+        return stats.dropna(how="all").reset_index()
+
+    def community_bundle(self, community):
+        """
+        Everything stored for one community, for drawing its graphs in the
+        browser: the labels along the other axes, the `shape` of the block
+        (model, scenario, year, month, variable) and its values in tenths as
+        base64 little-endian int16, with MISSING_TENTHS for NaN.  Every
+        value has one decimal, so value = tenths / 10 exactly.
+        """
+        c = self.index["community"][community]
+        block = np.asarray(self.values[c])
+        tenths = np.where(np.isnan(block), MISSING_TENTHS, np.rint(block * 10))
+        bundle = {axis: self.labels[axis].tolist() for axis in AXES[1:]}
+        bundle.update(
+            community=community,
+            shape=list(block.shape),
+            missing=MISSING_TENTHS,
+            tenths=base64.b64encode(tenths.astype("<i2").tobytes()).decode("ascii"),
+        )
+        return bundle
+
+
+def read_columnar(path="data.parquet", communities=None, scenarios=None, columns=None):
+    """
+    Read melted rows from the typed `data.parquet` written by
+    `data_prep/make_pickle.py` (needs pyarrow).  Only `columns` are read,
+    and only the row groups for the requested communities/scenarios.
+    """
+    import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+    parquet = pq.ParquetFile(path)
+    row_groups = json.loads(parquet.schema_arrow.metadata[b"row_groups"])
+    wanted = [
+        ix
+        for ix, row_group in enumerate(row_groups)
+        if (communities is None or row_group.split("|")[0] in communities)
+        and (scenarios is None or row_group.split("|")[1] in scenarios)
+    ]
+    return parquet.read_row_groups(wanted, columns=columns).to_pandas()
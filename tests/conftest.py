@@ -0,0 +1,33 @@
+"""
+Shared fixtures.  The app reads its data files relative to the repository
+root, so tests run from there; the store tests need the generated data
+(`python data_prep/make_pickle.py`) and are skipped without it.
+"""
+# pylint: disable=invalid-name, import-error, wrong-import-position
+import os
+import sys
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(root)
+sys.path.insert(0, root)
+os.environ.setdefault("MAPBOX_ACCESS_TOKEN", "")
+os.environ.setdefault("WARM_UP", "0")
+
+from store import ClimateStore
+
+
+@pytest.fixture(scope="session")
+def store():
+    """ The store written by data_prep/make_pickle.py. """
+    if not os.path.exists("data.npy"):
+        pytest.skip("run python data_prep/make_pickle.py first")
+    return ClimateStore.load("data")
+
+
+@pytest.fixture(scope="session")
+def app_module(store):  # pylint: disable=unused-argument
+    """ The application module, imported once the data is there. """
+    import application  # pylint: disable=import-outside-toplevel
+
+    return application
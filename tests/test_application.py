@@ -0,0 +1,60 @@
+"""
+Tests for the routes and callbacks in `application.py`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import inspect
+import pytest
+from dash.exceptions import PreventUpdate
+import gui
+
+
+@pytest.fixture
+def client(app_module):
+    """ A test client for the Flask server. """
+    return app_module.application.test_client()
+
+
+@pytest.mark.parametrize("community", ["-1", "46", "x"])
+def test_export_rejects_unknown_communities(client, community):
+    response = client.get(f"/export.csv?community={community}&month=7")
+    assert response.status_code == 400
+
+
+def test_export_duplicate_months_once(client):
+    """ Repeated parameters select the same rows as a single one. """
+    query = "/export.csv?community=45&model=NCAR-CCSM4&variable=tas"
+    once = client.get(query + "&month=7").get_data(as_text=True)
+    twice = client.get(query + "&month=7&month=7&community=45").get_data(as_text=True)
+    assert twice == once
+    assert len(once.splitlines()) > 1
+
+
+def test_graph_duplicate_months_once(app_module):
+    update_graph = inspect.unwrap(app_module.update_graph)
+    args = [45, [2000, 2300], ["rcp85"], ["NCAR-CCSM4", "NCAR-CCSM4"]]
+    assert update_graph(*args, [7, 7], [], "tas") == update_graph(*args[:3], ["NCAR-CCSM4"], [7], [], "tas")
+    assert update_graph(*args, [12, 1, 1, 2], [], "pr") == update_graph(*args, [12, 1, 2], [], "pr")
+
+
+def test_comparison_waits_for_its_section(app_module):
+    """
+    The form only reaches the comparison through the selection the
+    browser passes on while the section is open, which starts closed.
+    """
+    callbacks = {c["output"]: c for c in app_module.app._callback_list}  # pylint: disable=protected-access
+    server = callbacks["comparison-traces.data"]
+    assert server["inputs"] == [{"id": "comparison-selection", "property": "data"}]
+    assert server["prevent_initial_call"]
+    gate = callbacks["comparison-selection.data"]
+    assert gate["clientside_function"]["function_name"] == "comparisonSelection"
+    assert gate["inputs"][0] == {"id": "compare-toggle", "property": "value"}
+    toggle = [c for c in gui.comparison_layout._traverse() if getattr(c, "id", None) == "compare-toggle"]  # pylint: disable=protected-access
+    assert toggle[0].value == []
+
+
+def test_comparison_traces(app_module):
+    with pytest.raises(PreventUpdate):
+        app_module.comparison_traces(None)
+    selection = [[45, "mean"], "5ModelAvg", "rcp85", [2000, 2300], [7], [], "tas"]
+    traces = app_module.comparison_traces(selection)
+    assert [trace["name"] for trace in traces] == ["Yellowknife", app_module.luts.territory_mean_label]
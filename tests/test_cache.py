@@ -0,0 +1,141 @@
+"""
+Tests for the figure caches in `cache.py`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import os
+import time
+import pytest
+import cache
+from cache import FigureCache, FileBackend, MemoryBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ A monotonic clock the test moves forward by hand. """
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_lru_evicts_least_recently_used():
+    figures = FigureCache(max_entries=2)
+    figures.set("a", [1])
+    figures.set("b", [2])
+    assert figures.get("a") == [1]
+    figures.set("c", [3])
+    assert figures.get("b") is None
+    assert figures.get("a") == [1]
+    assert figures.get("c") == [3]
+    stats = figures.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 3, 1, 1)
+
+
+def test_zero_entries_disables_caching():
+    figures = FigureCache(max_entries=0)
+    figures.set("a", [1])
+    assert figures.get("a") is None
+
+
+def test_zero_entries_skips_shared_backend():
+    shared = MemoryBackend()
+    FigureCache(shared=shared).set("a", [1])
+    figures = FigureCache(max_entries=0, shared=shared)
+    assert figures.get("a") is None
+    figures.set("b", [2])
+    assert FigureCache(shared=shared).get("b") is None
+    assert figures.stats()["shared_hits"] == 0
+
+
+def test_ttl_expires_entries(clock):
+    figures = FigureCache(ttl=60)
+    figures.set("a", [1])
+    clock[0] += 59
+    assert figures.get("a") == [1]
+    clock[0] += 2
+    assert figures.get("a") is None
+    assert figures.stats()["entries"] == 0
+
+
+def test_shared_hits_between_workers():
+    """ A value set by one worker's cache is found by another's. """
+    shared = MemoryBackend()
+    first = FigureCache(shared=shared, namespace="traces")
+    second = FigureCache(shared=shared, namespace="traces")
+    other = FigureCache(shared=shared, namespace="comparison")
+    first.set(("key", 1), [{"x": [1, 2], "y": [0.5, 1.5]}])
+    assert second.get(("key", 1)) == [{"x": [1, 2], "y": [0.5, 1.5]}]
+    assert second.stats()["shared_hits"] == 1
+    # Then from its own memory
+    assert second.get(("key", 1)) is not None
+    assert second.stats()["hits"] == 1
+    assert other.get(("key", 1)) is None
+
+
+def test_memoize_computes_once_per_key():
+    figures = FigureCache()
+    calls = []
+
+    @figures.memoize(lambda months: tuple(sorted(months)))
+    def traces(months):
+        calls.append(months)
+        return [len(months)]
+
+    assert traces([12, 1, 2]) == [3]
+    assert traces([1, 2, 12]) == [3]
+    assert traces([7]) == [1]
+    assert len(calls) == 2
+
+
+def test_file_backend_round_trip(tmp_path):
+    backend = FileBackend(str(tmp_path))
+    assert backend.get("a") is None
+    backend.set("a", '{"x": 1}')
+    assert backend.get("a") == '{"x": 1}'
+    assert FileBackend(str(tmp_path)).get("a") == '{"x": 1}'
+
+
+def test_file_backend_ignores_and_prunes_expired(tmp_path):
+    backend = FileBackend(str(tmp_path), ttl=60, prune_interval=0)
+    backend.set("old", "1")
+    hour_ago = time.time() - 3600
+    os.utime(backend._path("old"), (hour_ago, hour_ago))  # pylint: disable=protected-access
+    assert backend.get("old") is None
+    backend.set("new", "2")
+    assert os.listdir(tmp_path) == [os.path.basename(backend._path("new"))]  # pylint: disable=protected-access
+    assert backend.get("new") == "2"
+
+
+def test_file_backend_keeps_newest_entries(tmp_path):
+    backend = FileBackend(str(tmp_path), max_entries=3, prune_interval=0)
+    for ix in range(6):
+        backend.set(str(ix), str(ix))
+        written = time.time() - 100 + ix
+        os.utime(backend._path(str(ix)), (written, written))  # pylint: disable=protected-access
+    backend.prune()
+    assert len(os.listdir(tmp_path)) == 3
+    assert [backend.get(str(ix)) for ix in range(6)] == [None, None, None, "3", "4", "5"]
+
+
+def test_file_backend_prunes_at_most_every_interval(tmp_path):
+    backend = FileBackend(str(tmp_path), max_entries=1, prune_interval=3600)
+    for key in "abc":
+        backend.set(key, key)
+    # Pruned on the first write only
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_max_bytes_evicts_by_json_size():
+    figures = FigureCache(max_bytes=100)
+    figures.set("a", ["x" * 40])
+    figures.set("b", ["y" * 40])
+    assert figures.stats()["bytes"] == 88
+    figures.set("c", ["z" * 40])
+    assert figures.get("a") is None
+    assert figures.stats()["bytes"] == 88
+    # Replacing an entry counts its new size only
+    figures.set("c", ["z"])
+    assert figures.stats()["bytes"] == 49
+    # A value over the limit on its own isn't kept
+    figures.set("d", ["w" * 200])
+    assert figures.get("d") is None
+    assert figures.stats()["entries"] == 0
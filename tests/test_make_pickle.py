@@ -0,0 +1,70 @@
+"""
+Tests for the incremental rebuild in `data_prep/make_pickle.py`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+outputs = ["data.npy", "data_presets.npy", "data_stats.npy"]
+
+
+def make_pickle(directory):
+    """ Run data_prep/make_pickle.py in `directory`, returning what it printed. """
+    result = subprocess.run(
+        [sys.executable, os.path.join(root, "data_prep", "make_pickle.py")],
+        cwd=directory,
+        env=dict(os.environ, PYTHONPATH=root),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout
+
+
+@pytest.fixture
+def built(tmp_path):
+    """ A copy of the CSVs, with the data built from them. """
+    shutil.copytree(os.path.join(root, "data"), tmp_path / "data")
+    assert "Built all" in make_pickle(tmp_path)
+    return tmp_path
+
+
+def edit(directory, scenario, change):
+    """ Rewrite a scenario's CSV with `change(frame)`. """
+    fn = directory / "data" / f"tas_pr_nwt_decadal_mean_{scenario}_melted.csv"
+    change(pd.read_csv(fn, index_col=0)).to_csv(fn)
+
+
+def check_matches_full_build(directory, tmp_path):
+    """ The data in `directory` is what a build from scratch gives. """
+    full = tmp_path / "full"
+    shutil.copytree(directory / "data", full / "data")
+    assert "Built all" in make_pickle(full)
+    for fn in outputs + ["data.json"]:
+        if fn.endswith(".npy"):
+            np.testing.assert_array_equal(np.load(directory / fn), np.load(full / fn))
+        else:
+            assert (directory / fn).read_text() == (full / fn).read_text()
+
+
+def test_merges_changed_partition(built, tmp_path):
+    def warmer(frame):
+        frame.loc[frame["model"] == "GFDL-CM3", "tas"] += 1
+        return frame
+
+    edit(built, "rcp85", warmer)
+    assert "Merged 1 of 48" in make_pickle(built)
+    check_matches_full_build(built, tmp_path)
+
+
+def test_clears_removed_partitions(built, tmp_path):
+    """ A model dropped from one scenario leaves no values behind. """
+    edit(built, "rcp45", lambda frame: frame[frame["model"] != "MRI-CGCM3"])
+    assert "Merged 2 of 46" in make_pickle(built)
+    check_matches_full_build(built, tmp_path)
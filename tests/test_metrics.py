@@ -0,0 +1,63 @@
+"""
+Tests for the /metrics route in `metrics.py`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import dash
+import pytest
+from dash import dcc, html
+from dash.dependencies import Input, Output
+import metrics
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """ A test client of a small app with metrics enabled. """
+    monkeypatch.setattr(metrics, "enabled", True)
+    monkeypatch.setattr(metrics, "histograms", {})
+    monkeypatch.setattr(metrics, "stats_sources", {})
+    app = dash.Dash(__name__)
+    app.layout = html.Div([dcc.Input(id="name", value="x"), html.Div(id="greeting")])
+
+    @app.callback(Output("greeting", "children"), [Input("name", "value")])
+    def greet(name):
+        return f"Hello {name}"
+
+    metrics.init_app(app, "/metrics")
+    metrics.register_stats("cache", lambda: {"hits": 3})
+    return app.server.test_client()
+
+
+def update(client, output):
+    """ POST a callback request for `output`, as the renderer would. """
+    return client.post(
+        "/_dash-update-component",
+        json={
+            "output": output,
+            "outputs": {"id": "greeting", "property": "children"},
+            "inputs": [{"id": "name", "property": "value", "value": "you"}],
+            "changedPropIds": ["name.value"],
+        },
+    )
+
+
+def test_times_known_callbacks(client):
+    assert update(client, "greeting.children").status_code == 200
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'nwt_callback_seconds_count{callback="greeting.children",stage="request"} 1' in text
+    assert 'nwt_stats{source="cache",stat="hits"} 3' in text
+    stats = client.get("/metrics?format=json").get_json()
+    assert stats["callbacks"]["greeting.children.request"]["count"] == 1
+
+
+def test_unknown_outputs_share_one_histogram(client):
+    for output in ['x"0', "made.up", "y\\1\nz"]:
+        update(client, output)
+    client.post("/_dash-update-component", json={"output": ["not", "a", "string"]})
+    client.post("/_dash-update-component", data="junk", content_type="application/json")
+    assert list(metrics.histograms) == [("unknown", "request")]
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'nwt_callback_seconds_count{callback="unknown",stage="request"} 5' in text
+
+
+def test_label_values_escaped():
+    assert metrics._label('a"b\\c\nd') == 'a\\"b\\\\c\\nd'  # pylint: disable=protected-access
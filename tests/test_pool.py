@@ -0,0 +1,148 @@
+"""
+Tests for merging and superseding callback computations in `pool.py`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import threading
+import time
+import pytest
+from dash.exceptions import PreventUpdate
+from flask import Flask
+from pool import CallbackPool, page_field
+
+server = Flask(__name__)
+
+
+def wait_for(condition, timeout=5):
+    """ Poll until `condition()` holds. """
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+class Calls:
+    """
+    A computation recording its calls, which blocks until released when
+    asked to, and the outcome of each request made in a thread.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.outcomes = {}
+        self.threads = []
+
+    def compute(self, key, block=False):
+        self.calls.append(key)
+        if block:
+            assert self.release.wait(5)
+        return f"result {key}"
+
+    def request(self, pool, name, key, page=None, block=False):
+        """ Run `key` through `pool` as a callback request from `page`, in a thread. """
+
+        def target():
+            with server.test_request_context(json={page_field: page} if page else {}):
+                try:
+                    self.outcomes[name] = pool.run("update_graph", key, self.compute, key, block)
+                except PreventUpdate:
+                    self.outcomes[name] = PreventUpdate
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        self.threads.append(thread)
+
+    def finish(self):
+        self.release.set()
+        for thread in self.threads:
+            thread.join(5)
+
+
+@pytest.mark.parametrize("threads", [0, 2])
+def test_identical_calls_share_one_computation(threads):
+    pool = CallbackPool(threads)
+    calls = Calls()
+    calls.request(pool, "first", "A", block=True)
+    wait_for(lambda: calls.calls)
+    for ix in range(5):
+        calls.request(pool, ix, "A", block=True)
+    wait_for(lambda: pool.stats()["coalesced"] == 5)
+    calls.finish()
+    assert calls.calls == ["A"]
+    assert set(calls.outcomes.values()) == {"result A"}
+    assert len(calls.outcomes) == 6
+    assert pool.stats()["in_flight"] == 0
+    # Computed again once the first computation is over
+    calls.request(pool, "later", "A")
+    calls.finish()
+    assert calls.calls == ["A", "A"]
+
+
+def test_errors_reach_every_caller():
+    pool = CallbackPool()
+    with pytest.raises(ZeroDivisionError):
+        pool.run("update_graph", "A", lambda: 1 / 0)
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_queued_computation_dropped_when_superseded():
+    pool = CallbackPool(1)
+    calls = Calls()
+    calls.request(pool, "A", "A", page="tab", block=True)
+    wait_for(lambda: calls.calls)
+    calls.request(pool, "B", "B", page="tab")
+    wait_for(lambda: pool.stats()["computed"] == 2)
+    calls.request(pool, "C", "C", page="tab")
+    wait_for(lambda: "B" in calls.outcomes)
+    calls.finish()
+    assert calls.outcomes == {"A": "result A", "B": PreventUpdate, "C": "result C"}
+    assert calls.calls == ["A", "C"]
+    assert pool.stats()["superseded"] == 1
+
+
+def test_pages_dont_supersede_each_other():
+    """ Two tabs, even of one browser, each get their latest selection. """
+    pool = CallbackPool(1)
+    calls = Calls()
+    calls.request(pool, "A", "A", page="tab 1", block=True)
+    wait_for(lambda: calls.calls)
+    calls.request(pool, "B", "B", page="tab 1")
+    wait_for(lambda: pool.stats()["computed"] == 2)
+    calls.request(pool, "C", "C", page="tab 2")
+    wait_for(lambda: pool.stats()["computed"] == 3)
+    calls.finish()
+    assert calls.outcomes == {"A": "result A", "B": "result B", "C": "result C"}
+    assert pool.stats()["superseded"] == 0
+
+
+def test_shared_computation_dropped_for_one_page_still_served_to_another():
+    pool = CallbackPool(1)
+    calls = Calls()
+    calls.request(pool, "A", "A", page="tab 1", block=True)
+    wait_for(lambda: calls.calls)
+    calls.request(pool, "B", "B", page="tab 1")
+    wait_for(lambda: pool.stats()["computed"] == 2)
+    calls.request(pool, "B again", "B", page="tab 2")
+    calls.request(pool, "B, no page", "B")
+    wait_for(lambda: pool.stats()["coalesced"] == 2)
+    calls.request(pool, "C", "C", page="tab 1")
+    wait_for(lambda: "B" in calls.outcomes)
+    calls.finish()
+    assert calls.outcomes == {
+        "A": "result A",
+        "B": PreventUpdate,
+        "B again": "result B",
+        "B, no page": "result B",
+        "C": "result C",
+    }
+
+
+def test_pages_send_their_id_only_with_a_pool():
+    class App:
+        renderer = "var renderer = new DashRenderer();"
+
+    app = App()
+    CallbackPool().init_app(app)
+    assert app.renderer == "var renderer = new DashRenderer();"
+    CallbackPool(2).init_app(app)
+    assert f"payload.{page_field} = " in app.renderer
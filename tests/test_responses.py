@@ -0,0 +1,35 @@
+"""
+Tests for the compression and caching in `responses.py`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import gzip
+import responses
+
+
+def test_static_bodies_keyed_on_path(app_module):
+    """ Junk query strings reuse the one compressed copy of an asset. """
+    client = app_module.application.test_client()
+    responses._static_bodies.clear()  # pylint: disable=protected-access
+    bodies = []
+    for query in ["", "?x=1", "?x=2", "?x=3"]:
+        response = client.get("/assets/10_bulma.min.css" + query, headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        bodies.append(gzip.decompress(response.get_data()))
+        response.close()
+    assert len(responses._static_bodies) == 1  # pylint: disable=protected-access
+    assert all(body == bodies[0] for body in bodies)
+
+
+def test_static_bodies_keyed_without_suite_fingerprint(app_module):
+    """ Made-up component suite fingerprints reuse the one compressed copy. """
+    client = app_module.application.test_client()
+    responses._static_bodies.clear()  # pylint: disable=protected-access
+    for stamp in ["1792242853", "1", "2", "abc"]:
+        response = client.get(
+            f"/_dash-component-suites/dash/deps/polyfill@7.v2_18_2m{stamp}.12.1.min.js",
+            headers={"Accept-Encoding": "gzip"},
+        )
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        response.close()
+    assert len(responses._static_bodies) == 1  # pylint: disable=protected-access
@@ -0,0 +1,132 @@
+"""
+Tests for the queries of `store.ClimateStore`.
+"""
+# pylint: disable=invalid-name, import-error, redefined-outer-name
+import inspect
+import itertools
+import json
+import pandas as pd
+import pytest
+from store import ClimateStore
+
+
+def test_ensemble_without_models_or_scenarios(store):
+    """ Empty model or scenario selections give no rows, not an error. """
+    for models, scenarios in [([], ["rcp85"]), (["NCAR-CCSM4", "GFDL-CM3"], []), ([], [])]:
+        for months in [[7], [12, 1, 2], [1, 7]]:
+            envelope = store.ensemble("Yellowknife", models, scenarios, [2000, 2300], months, "tas")
+            assert envelope.empty
+            assert list(envelope.columns) == ["scenario", "year", "min", "median", "max"]
+
+
+def test_update_graph_ensemble_without_models(app_module):
+    """ The graph is empty, like in "lines" mode and in the browser. """
+    update_graph = inspect.unwrap(app_module.update_graph)
+    for models, scenarios in [([], ["rcp60", "rcp85"]), (["NCAR-CCSM4"], [])]:
+        for display in ["lines", "ensemble"]:
+            assert update_graph(45, [2000, 2300], scenarios, models, [12, 1, 2], [], "tas", display) == []
+
+
+# The multi-month averaging update_graph used before ClimateStore, kept
+# as the reference the store must match exactly: the rows of the shipped
+# CSVs filtered as the callback did, then averaged per model/scenario.
+csv_files = [
+    "data/tas_pr_nwt_decadal_mean_historical_melted.csv",
+    "data/tas_pr_nwt_decadal_mean_rcp45_melted.csv",
+    "data/tas_pr_nwt_decadal_mean_rcp60_melted.csv",
+    "data/tas_pr_nwt_decadal_mean_rcp85_melted.csv",
+]
+
+
+def reference_average_months(dff, model, scenario, variable_value):
+    """
+    in case of multiple months allowed to be chosen
+    average all of the months together to single traces.
+    """
+    sub_df = dff[(dff["model"] == model) & (dff["scenario"] == scenario)]
+    dfm = (
+        sub_df.groupby("month")
+        .apply(lambda x: x[variable_value].reset_index(drop=True))
+        .T.mean(axis=1)
+        .copy()
+    )
+
+    # convert back to a DataFrame from the output Series...
+    dfm = dfm.to_frame(name=variable_value).reset_index(drop=True)
+
+    # Round to one digit
+    dfm[variable_value] = dfm[variable_value].apply(lambda x: round(x, 1))
+
+    dfm["year"] = sub_df["year"].unique()
+    dfm["model"] = model
+    dfm["scenario"] = scenario
+    dfm["month"] = "_".join(["avg"] + [str(m) for m in dff.month.unique()])
+
+    return dfm
+
+
+def reference_series(rows, community, models, scenarios, year_range, months, variable):
+    """ The old update_graph filtering and averaging, on the CSV rows. """
+    selected = rows[rows.community.isin([community])]
+    selected = selected[selected.scenario.isin(scenarios)]
+    selected = selected[selected.model.isin(models)]
+    selected = selected[(selected["year"] >= year_range[0]) & (selected["year"] <= year_range[1])]
+    selected = selected.loc[selected["month"].isin(months)]
+    # Pairs without rows (e.g. historical for most models) raised there
+    pairs = [
+        (model, scenario)
+        for model, scenario in itertools.product(selected.model.unique(), selected.scenario.unique())
+        if ((selected.model == model) & (selected.scenario == scenario)).any()
+    ]
+    return pd.concat(
+        [reference_average_months(selected, model, scenario, variable) for model, scenario in pairs]
+    )
+
+
+@pytest.fixture(scope="module")
+def rows():
+    """ The melted rows of the shipped CSVs, as in the old data.pickle. """
+    return pd.concat([pd.read_csv(fn, index_col=0) for fn in csv_files], ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def plain_store(store):
+    """ The same cube without the precomputed presets. """
+    with open("data.json", encoding="utf-8") as f:
+        return ClimateStore(store.values, json.load(f))
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+@pytest.mark.parametrize(
+    "months, preset",
+    [
+        ([12, 1, 2], True),
+        ([3, 4, 5], True),
+        ([6, 7, 8], True),
+        ([9, 10, 11], True),
+        (list(range(1, 13)), True),
+        ([1, 7], False),
+        ([7, 7, 8], False),
+        ([2, 12, 12, 1], True),
+    ],
+)
+def test_average_months_matches_reference(store, plain_store, rows, months, preset):
+    """
+    Presets (annual, seasons) are read from data_presets.npy, the other
+    selections averaged from the cube; both match the old averaging
+    exactly, repeated months counting once.
+    """
+    assert (tuple(sorted(set(months))) in store.presets) == preset
+    models = list(store.labels["model"])
+    scenarios = list(store.labels["scenario"])
+    years = [int(store.labels["year"][0]), int(store.labels["year"][-1])]
+    for community in ["Aklavik", "Behchokǫ̀", "Yellowknife", store.labels["community"][-1]]:
+        for variable in ["tas", "pr"]:
+            expected = reference_series(rows, community, models, scenarios, years, months, variable)
+            expected = expected.sort_values(["model", "scenario", "year"]).reset_index(drop=True)
+            for source in [store, plain_store]:
+                averaged = source.average_months(community, models, scenarios, years, months, variable)
+                averaged = averaged.sort_values(["model", "scenario", "year"]).reset_index(drop=True)
+                for column in ["model", "scenario", "year", "month"]:
+                    assert averaged[column].tolist() == expected[column].tolist()
+                assert averaged[variable].tolist() == expected[variable].tolist()